@@ -0,0 +1,276 @@
+"""
+Backends de armazenamento das fotos, escolhidos em STORAGES["default"].
+
+- LocalStorage: o FileSystemStorage de sempre (MEDIA_ROOT).
+- S3Storage: qualquer serviço compatível com S3 (AWS, MinIO, ...), falando a
+  API REST com assinatura SigV4, sem dependências extras.
+
+Os dois sabem gerar uma URL de upload direto (`url_de_upload`): o cliente envia
+os bytes da foto para ela, sem passar por um worker da API, e depois confirma
+o upload (ver as views de Mídia). No S3 é uma URL pré-assinada, que já exige o
+tamanho e o SHA-256 declarados; no local é um endpoint da própria API
+(`upload_direto`), autorizado por um token assinado.
+
+O S3Storage também lista o bucket em ordem (`arquivos`), para o
+`manage.py purge_media`.
+"""
+import base64
+import datetime
+import hashlib
+import hmac
+import os
+from urllib.error import HTTPError
+from urllib.parse import quote, urlencode, urlsplit
+from urllib.request import Request, urlopen
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.urls import reverse
+from django.utils.deconstruct import deconstructible
+
+SALT_UPLOAD = "api.armazenamento.upload"
+
+
+def validade_upload():
+    return getattr(settings, "UPLOAD_DIRETO_VALIDADE", 10 * 60)
+
+
+@deconstructible
+class LocalStorage(FileSystemStorage):
+    def url_de_upload(self, request, nome, sha256, tamanho, tipo):
+        token = signing.dumps(
+            {"nome": nome, "sha256": sha256, "tamanho": tamanho, "tipo": tipo},
+            salt=SALT_UPLOAD,
+        )
+        return {
+            "url": request.build_absolute_uri(reverse("upload-direto", args=[token])),
+            "method": "PUT",
+            "headers": {"Content-Type": tipo},
+        }
+
+    def mover(self, origem, destino):
+        # Mesmo disco: só um rename
+        caminho = self.path(destino)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        os.replace(self.path(origem), caminho)
+
+
+def ler_token_upload(token):
+    """
+    Dados do upload autorizado por `token`, ou None se inválido ou expirado.
+    """
+    try:
+        return signing.loads(token, salt=SALT_UPLOAD, max_age=validade_upload())
+    except signing.BadSignature:
+        return None
+
+
+def ler_inicio(storage, nome, tamanho=16):
+    """
+    Primeiros bytes de `nome`, para conferir o formato sem baixar o arquivo.
+    """
+    if hasattr(storage, "ler_trecho"):
+        return storage.ler_trecho(nome, 0, tamanho)
+    with storage.open(nome, "rb") as arquivo:
+        return arquivo.read(tamanho)
+
+
+def mover(storage, origem, destino):
+    if hasattr(storage, "mover"):
+        storage.mover(origem, destino)
+        return
+    with storage.open(origem, "rb") as arquivo:
+        storage.save(destino, arquivo)
+    storage.delete(origem)
+
+
+def _hmac(chave, mensagem):
+    return hmac.new(chave, mensagem.encode(), hashlib.sha256).digest()
+
+
+def _quote(valor, safe="-_.~"):
+    return quote(valor, safe=safe)
+
+
+@deconstructible
+class S3Storage(Storage):
+    """
+    Objetos num bucket S3 (path-style: <endpoint>/<bucket>/<nome>). As URLs de
+    leitura também são pré-assinadas, com validade de `url_expira` segundos.
+    """
+
+    def __init__(
+        self, endpoint_url=None, bucket=None, region="us-east-1",
+        access_key=None, secret_key=None, url_expira=60 * 60,
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.url_expira = url_expira
+
+    # Assinatura SigV4
+
+    def _escopo(self, quando):
+        return f"{quando:%Y%m%d}/{self.region}/s3/aws4_request"
+
+    def _assinar(self, metodo, caminho, query, headers, quando):
+        headers = {nome.lower(): str(valor).strip() for nome, valor in headers.items()}
+        assinados = ";".join(sorted(headers))
+        canonico = "\n".join([
+            metodo,
+            caminho,
+            "&".join(f"{_quote(k)}={_quote(str(v))}" for k, v in sorted(query.items())),
+            "".join(f"{nome}:{headers[nome]}\n" for nome in sorted(headers)),
+            assinados,
+            "UNSIGNED-PAYLOAD",
+        ])
+        texto = "\n".join([
+            "AWS4-HMAC-SHA256",
+            f"{quando:%Y%m%dT%H%M%SZ}",
+            self._escopo(quando),
+            hashlib.sha256(canonico.encode()).hexdigest(),
+        ])
+        chave = ("AWS4" + self.secret_key).encode()
+        for parte in (f"{quando:%Y%m%d}", self.region, "s3", "aws4_request"):
+            chave = _hmac(chave, parte)
+        return assinados, hmac.new(chave, texto.encode(), hashlib.sha256).hexdigest()
+
+    def _caminho(self, nome=""):
+        return f"/{self.bucket}/" + _quote(nome, safe="-_.~/")
+
+    def _host(self):
+        return urlsplit(self.endpoint_url).netloc
+
+    def pre_assinar(self, metodo, nome, expira, headers=None):
+        quando = datetime.datetime.now(datetime.timezone.utc)
+        headers = {"host": self._host(), **(headers or {})}
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{self._escopo(quando)}",
+            "X-Amz-Date": f"{quando:%Y%m%dT%H%M%SZ}",
+            "X-Amz-Expires": str(int(expira)),
+            "X-Amz-SignedHeaders": ";".join(sorted(nome.lower() for nome in headers)),
+        }
+        _, assinatura = self._assinar(metodo, self._caminho(nome), query, headers, quando)
+        query["X-Amz-Signature"] = assinatura
+        return f"{self.endpoint_url}{self._caminho(nome)}?{urlencode(query, quote_via=quote)}"
+
+    def _requisicao(self, metodo, nome="", query=None, corpo=None, headers=None):
+        quando = datetime.datetime.now(datetime.timezone.utc)
+        query = query or {}
+        headers = {
+            "host": self._host(),
+            "x-amz-date": f"{quando:%Y%m%dT%H%M%SZ}",
+            "x-amz-content-sha256": "UNSIGNED-PAYLOAD",
+            **(headers or {}),
+        }
+        assinados, assinatura = self._assinar(
+            metodo, self._caminho(nome), query, headers, quando
+        )
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{self._escopo(quando)}, "
+            f"SignedHeaders={assinados}, Signature={assinatura}"
+        )
+        url = self.endpoint_url + self._caminho(nome)
+        if query:
+            url += "?" + urlencode(sorted(query.items()), quote_via=quote)
+        del headers["host"]
+        return urlopen(Request(url, data=corpo, headers=headers, method=metodo))
+
+    def _head(self, nome):
+        try:
+            with self._requisicao("HEAD", nome) as resposta:
+                return resposta.headers
+        except HTTPError as erro:
+            if erro.code == 404:
+                return None
+            raise
+
+    # API de Storage do Django
+
+    def _open(self, nome, mode="rb"):
+        with self._requisicao("GET", nome) as resposta:
+            return ContentFile(resposta.read(), name=nome)
+
+    def _save(self, nome, conteudo):
+        conteudo.seek(0)
+        headers = {"Content-Length": str(conteudo.size)}
+        with self._requisicao("PUT", nome, corpo=conteudo, headers=headers):
+            pass
+        return nome
+
+    def exists(self, nome):
+        return self._head(nome) is not None
+
+    def delete(self, nome):
+        try:
+            with self._requisicao("DELETE", nome):
+                pass
+        except HTTPError as erro:
+            if erro.code != 404:
+                raise
+
+    def size(self, nome):
+        headers = self._head(nome)
+        if headers is None:
+            raise FileNotFoundError(nome)
+        return int(headers["Content-Length"])
+
+    def url(self, nome):
+        return self.pre_assinar("GET", nome, self.url_expira)
+
+    def ler_trecho(self, nome, inicio, tamanho):
+        headers = {"Range": f"bytes={inicio}-{inicio + tamanho - 1}"}
+        with self._requisicao("GET", nome, headers=headers) as resposta:
+            return resposta.read(tamanho)
+
+    def mover(self, origem, destino):
+        # Cópia dentro do próprio S3, sem baixar os bytes
+        headers = {"x-amz-copy-source": self._caminho(origem)}
+        with self._requisicao("PUT", destino, headers=headers):
+            pass
+        self.delete(origem)
+
+    def url_de_upload(self, request, nome, sha256, tamanho, tipo):
+        # Assinados: o S3 recusa bytes com outro tamanho ou outro SHA-256
+        headers = {
+            "Content-Type": tipo,
+            "Content-Length": str(tamanho),
+            "x-amz-checksum-sha256": base64.b64encode(bytes.fromhex(sha256)).decode(),
+        }
+        return {
+            "url": self.pre_assinar("PUT", nome, validade_upload(), headers),
+            "method": "PUT",
+            "headers": headers,
+        }
+
+    def arquivos(self):
+        """
+        (nome, tamanho, mtime) de cada objeto do bucket; o ListObjectsV2 já
+        devolve as chaves em ordem.
+        """
+        ns = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+        continuacao = None
+        while True:
+            query = {"list-type": "2"}
+            if continuacao:
+                query["continuation-token"] = continuacao
+            with self._requisicao("GET", query=query) as resposta:
+                raiz = ElementTree.fromstring(resposta.read())
+            for objeto in raiz.iter(f"{ns}Contents"):
+                modificado = datetime.datetime.fromisoformat(
+                    objeto.findtext(f"{ns}LastModified").replace("Z", "+00:00")
+                )
+                yield (
+                    objeto.findtext(f"{ns}Key"),
+                    int(objeto.findtext(f"{ns}Size")),
+                    modificado.timestamp(),
+                )
+            continuacao = raiz.findtext(f"{ns}NextContinuationToken")
+            if raiz.findtext(f"{ns}IsTruncated") != "true" or not continuacao:
+                return
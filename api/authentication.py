@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import PerfilUsuario
+
+PRINCIPAL_CACHE_TIMEOUT = getattr(settings, "PRINCIPAL_CACHE_TIMEOUT", 60)
+# O que fica em cache do usuário e do perfil (nunca a senha)
+CAMPOS_USUARIO = (
+    "id", "username", "email", "first_name", "last_name",
+    "is_active", "is_staff", "is_superuser",
+)
+CAMPOS_PERFIL = tuple(campo.attname for campo in PerfilUsuario._meta.concrete_fields)
+
+
+def _principal_key(user_id):
+    return f"auth:principal:{user_id}"
+
+
+def get_principal(user_id):
+    """
+    Usuário (com o perfil já carregado) para o id do token, ou None se não
+    existir. Invalidado por sinal sempre que o usuário ou o perfil são salvos.
+    """
+    key = _principal_key(user_id)
+    dados = cache.get(key)
+    if dados is None:
+        dados = _carregar_principal(user_id)
+        if dados is None:
+            return None
+        cache.set(key, dados, PRINCIPAL_CACHE_TIMEOUT)
+    return _montar_principal(dados)
+
+
+def _carregar_principal(user_id):
+    # Só campos simples, num dicionário: o hash da senha nunca vai para o
+    # cache, que é compartilhado (Redis); com CHECK_REVOKE_TOKEN guardamos só o
+    # md5 que o próprio token já carrega
+    campos_perfil = [f"perfilusuario__{campo}" for campo in CAMPOS_PERFIL]
+    extras = ["password"] if api_settings.CHECK_REVOKE_TOKEN else []
+    linha = (
+        User.objects.filter(pk=user_id)
+        .values(*CAMPOS_USUARIO, *campos_perfil, *extras)
+        .first()
+    )
+    if linha is None:
+        return None
+    dados = {
+        "usuario": {campo: linha[campo] for campo in CAMPOS_USUARIO},
+        "perfil": None,
+    }
+    if linha["perfilusuario__user_id"] is not None:
+        dados["perfil"] = {campo: linha[f"perfilusuario__{campo}"] for campo in CAMPOS_PERFIL}
+    if extras:
+        dados["revoke"] = get_md5_hash_password(linha["password"])
+    return dados
+
+
+def _montar_principal(dados):
+    # Os campos fora do cache ficam adiados (deferred): um save() grava só os
+    # carregados, sem apagar a senha, e lê-los custa uma consulta
+    db = router.db_for_read(User)
+    user = _instancia(User, db, dados["usuario"])
+    if dados["perfil"] is None:
+        # Como o select_related sem perfil: user.perfilusuario não consulta o banco
+        User._meta.get_field("perfilusuario").set_cached_value(user, None)
+    else:
+        user.perfilusuario = _instancia(PerfilUsuario, db, dados["perfil"])
+    user._revoke_claim = dados.get("revoke")
+    return user
+
+
+def _instancia(model, db, valores):
+    # from_db espera os valores na ordem dos campos do model
+    campos = [campo.attname for campo in model._meta.concrete_fields if campo.attname in valores]
+    return model.from_db(db, campos, [valores[campo] for campo in campos])
+
+
+def invalidate_principal(user_id):
+    cache.delete(_principal_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que busca o usuário (e o perfil) no cache em vez de
+    consultar o banco a cada requisição. As entradas duram pouco
+    (PRINCIPAL_CACHE_TIMEOUT) e são invalidadas quando o usuário ou o perfil
+    mudam (ver api.signals). Como o cache é compartilhado entre os workers
+    (ver api.cache.exigir_cache_compartilhado), uma conta desativada num
+    worker é recusada na hora por todos.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_principal(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != user._revoke_claim:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
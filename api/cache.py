@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import Conteudo
+from .pagination import ConteudoPagination
+from .serializers import ConteudoSerializer
+
+CATALOG_VERSION_KEY = "conteudo:catalog:version"
+CATALOG_CACHE_TIMEOUT = getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+
+# Marca conteúdos inexistentes/inativos para não consultar o banco de novo
+_NOT_FOUND = "__not_found__"
+
+
+def exigir_cache_compartilhado(alias="default"):
+    """
+    Recusa subir em produção com um cache na memória do processo: cada worker
+    teria a sua versão do catálogo e o seu usuário autenticado em cache, e uma
+    invalidação feita num deles não chegaria aos outros (catálogo velho por
+    até CATALOG_CACHE_TIMEOUT, conta desativada aceita por até
+    PRINCIPAL_CACHE_TIMEOUT).
+    """
+    if settings.DEBUG or getattr(settings, "CACHE_LOCAL_PERMITIDO", False):
+        return
+    if isinstance(caches[alias], LocMemCache):
+        raise ImproperlyConfigured(
+            f"O cache '{alias}' é local ao processo (LocMemCache). Configure um "
+            "cache compartilhado (ex.: REDIS_URL) ou, com um único worker, "
+            "CACHE_LOCAL_PERMITIDO = True."
+        )
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Se a chave foi despejada, recomeça de um valor que nunca foi usado,
+        # senão entradas antigas da mesma versão voltariam a ser servidas.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        return cache.get(CATALOG_VERSION_KEY)
+
+
+def get_catalog():
+    """
+    Lista serializada de conteúdos ativos da versão atual do catálogo.
+    """
+    key = f"conteudo:catalog:v{get_catalog_version()}"
+    data = cache.get(key)
+    if data is None:
+        conteudos = Conteudo.objects.filter(is_active=True).order_by(
+            *ConteudoPagination.ordering
+        )
+        data = list(ConteudoSerializer(conteudos, many=True).data)
+        cache.set(key, data, CATALOG_CACHE_TIMEOUT)
+    return data
+
+
+def get_conteudo_data(pk):
+    """
+    Conteúdo ativo serializado, ou None se não existir.
+    """
+    key = f"conteudo:item:v{get_catalog_version()}:{pk}"
+    data = cache.get(key)
+    if data is None:
+        conteudo = Conteudo.objects.filter(pk=pk, is_active=True).first()
+        data = dict(ConteudoSerializer(conteudo).data) if conteudo else _NOT_FOUND
+        cache.set(key, data, CATALOG_CACHE_TIMEOUT)
+    return None if data == _NOT_FOUND else data
@@ -0,0 +1,80 @@
+"""
+Validadores para GET condicional (ETag / Last-Modified).
+
+Usados com `django.views.decorators.http.condition` por baixo do `api_view`,
+então rodam depois da autenticação e respondem 304 sem serializar nada.
+As listagens só emitem ETag: um Last-Modified agregado não mudaria quando
+uma linha é removida.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import get_catalog_version, get_conteudo_data
+from .models import Avaliacao, PerfilUsuario, Prova
+from .serializers import ProvaFiltroSerializer
+
+
+def _etag(*parts):
+    return hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+
+def _queryset_fingerprint(request, queryset, *extra):
+    fingerprint = queryset.order_by().aggregate(
+        total=Count("id"), ultima=Max("atualizado_em")
+    )
+    return _etag(
+        request.get_full_path(), fingerprint["total"], fingerprint["ultima"], *extra
+    )
+
+
+def me_etag(request, *args, **kwargs):
+    user = request.user
+    try:
+        perfil_atualizado = user.perfilusuario.atualizado_em
+    except PerfilUsuario.DoesNotExist:
+        perfil_atualizado = None
+    return _etag(
+        user.pk, user.username, user.email, user.is_staff, perfil_atualizado
+    )
+
+
+def conteudo_list_etag(request, *args, **kwargs):
+    return _etag(request.get_full_path(), get_catalog_version())
+
+
+def conteudo_detail_etag(request, pk, *args, **kwargs):
+    data = get_conteudo_data(pk)
+    if data is None:
+        return None
+    return _etag(pk, data["atualizado_em"])
+
+
+def conteudo_detail_last_modified(request, pk, *args, **kwargs):
+    data = get_conteudo_data(pk)
+    if data is None or not data.get("atualizado_em"):
+        return None
+    return parse_datetime(data["atualizado_em"])
+
+
+def prova_list_etag(request, *args, **kwargs):
+    filtro = ProvaFiltroSerializer(data=request.query_params)
+    if not filtro.is_valid():
+        # A view responde 400
+        return None
+    queryset = filtro.filtrar(Prova.objects.filter(usuario=request.user))
+    # `upcoming` depende do dia, então o dia entra na ETag
+    return _queryset_fingerprint(request, queryset, timezone.localdate())
+
+
+def avaliacao_list_etag(request, *args, **kwargs):
+    queryset = Avaliacao.objects.filter(user=request.user)
+    tema = request.query_params.get("tema")
+    if tema:
+        queryset = queryset.filter(conteudo__tema=tema)
+    # Cada avaliação embute o usuário e o conteúdo serializados
+    return _queryset_fingerprint(
+        request, queryset, me_etag(request), get_catalog_version()
+    )
@@ -0,0 +1,172 @@
+"""
+Entrega dos arquivos de mídia (fotos de perfil e de provas).
+
+Antes o MEDIA_ROOT era servido pelo `static()` do Django: só com DEBUG, lendo o
+arquivo em Python, sem cabeçalhos de cache nem Range, e qualquer um com a URL
+via a foto de uma prova. A view `media_serve` confere o acesso (ver
+`pode_ver`) e então:
+
+- com MEDIA_ENTREGA = "x-accel-redirect" (nginx) ou "x-sendfile" (Apache,
+  lighttpd), devolve só o cabeçalho e o proxy envia o arquivo;
+- sem proxy, responde com FileResponse, que o servidor WSGI (ex.: gunicorn)
+  envia com os.sendfile, sem copiar os bytes para o Python;
+- com um storage remoto (S3Storage), redireciona para uma URL assinada.
+
+As respostas têm ETag, Cache-Control (longo e `immutable` para os nomes por
+conteúdo, que nunca mudam) e suporte a um intervalo de bytes (Range).
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .imagens import originais
+from .midia import PASTA
+from .models import PerfilUsuario, Prova
+
+UM_ANO = 365 * 24 * 60 * 60
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def pode_ver(user, nome):
+    """
+    Fotos de prova só para o dono. Das fotos de perfil, as miniaturas são
+    visíveis para qualquer usuário autenticado, mas o original, que guarda os
+    metadados do celular (EXIF, inclusive localização), só para o dono. A
+    equipe vê tudo.
+    """
+    candidatos = originais(nome)
+    provas = Prova.objects.filter(foto__in=candidatos)
+    perfis = PerfilUsuario.objects.filter(fotoPerfil__in=candidatos)
+    if not user.is_staff:
+        provas = provas.filter(usuario=user)
+        if candidatos == [nome]:
+            perfis = perfis.filter(user=user)
+    return provas.exists() or perfis.exists()
+
+
+def imutavel(nome):
+    # O nome dos arquivos por conteúdo é o hash dos bytes (ver api.midia)
+    return nome.startswith(PASTA + "/")
+
+
+class Trecho:
+    """
+    Parte [inicio, inicio + tamanho) de um arquivo aberto. Expõe `fileno` e
+    deixa o descritor posicionado no início, para o servidor WSGI poder usar
+    os.sendfile (com o Content-Length) em vez de chamar `read`.
+    """
+
+    def __init__(self, arquivo, inicio, tamanho):
+        self.arquivo = arquivo
+        self.restante = tamanho
+        arquivo.seek(inicio)
+
+    def read(self, tamanho=-1):
+        if self.restante <= 0:
+            return b""
+        if tamanho < 0 or tamanho > self.restante:
+            tamanho = self.restante
+        dados = self.arquivo.read(tamanho)
+        self.restante -= len(dados)
+        return dados
+
+    def fileno(self):
+        return self.arquivo.fileno()
+
+    def close(self):
+        self.arquivo.close()
+
+
+def intervalo(cabecalho, tamanho):
+    """
+    (inicio, fim) inclusivo do cabeçalho Range, None para ignorá-lo (ausente,
+    inválido ou com vários intervalos) ou ValueError se estiver fora do arquivo.
+    """
+    encontrado = _RANGE.match(cabecalho or "")
+    if not encontrado or encontrado.groups() == ("", ""):
+        return None
+    inicio, fim = encontrado.groups()
+    if inicio == "":
+        # "bytes=-N": os últimos N bytes
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio = int(inicio)
+        fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        raise ValueError(cabecalho)
+    return inicio, fim
+
+
+def resposta_arquivo(request, storage, nome):
+    try:
+        caminho = storage.path(nome)
+    except NotImplementedError:
+        # Storage remoto (ex.: S3): o cliente baixa direto de uma URL assinada
+        response = HttpResponseRedirect(storage.url(nome))
+        response["Cache-Control"] = "private, no-store"
+        return response
+    except SuspiciousFileOperation:
+        raise Http404()
+    try:
+        info = os.stat(caminho)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404()
+    etag = (
+        '"%s"' % os.path.splitext(os.path.basename(nome))[0]
+        if imutavel(nome)
+        else '"%x-%x"' % (info.st_size, int(info.st_mtime))
+    )
+    cache_control = (
+        f"private, max-age={UM_ANO}, immutable" if imutavel(nome) else "private, no-cache"
+    )
+
+    def cabecalhos(response):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(info.st_mtime)
+        response["Cache-Control"] = cache_control
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    naomodificado = get_conditional_response(
+        request, etag=etag, last_modified=int(info.st_mtime)
+    )
+    if naomodificado is not None:
+        return cabecalhos(naomodificado)
+
+    tipo = mimetypes.guess_type(nome)[0] or "application/octet-stream"
+    entrega = getattr(settings, "MEDIA_ENTREGA", None)
+    if entrega == "x-accel-redirect":
+        # O nginx serve o arquivo (com Range) de uma location `internal`
+        response = HttpResponse(content_type=tipo)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + nome
+        return cabecalhos(response)
+    if entrega == "x-sendfile":
+        response = HttpResponse(content_type=tipo)
+        response["X-Sendfile"] = caminho
+        return cabecalhos(response)
+
+    status, inicio, fim = 200, 0, info.st_size - 1
+    if request.headers.get("If-Range", etag) == etag:
+        try:
+            trecho = intervalo(request.headers.get("Range"), info.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{info.st_size}"
+            return cabecalhos(response)
+        if trecho:
+            status, (inicio, fim) = 206, trecho
+
+    tamanho = fim - inicio + 1
+    response = FileResponse(
+        Trecho(open(caminho, "rb"), inicio, tamanho), status=status, content_type=tipo
+    )
+    response["Content-Length"] = tamanho
+    if status == 206:
+        response["Content-Range"] = f"bytes {inicio}-{fim}/{info.st_size}"
+    return cabecalhos(response)
@@ -0,0 +1,168 @@
+"""
+Hash de senhas fora da thread da requisição, com concorrência limitada.
+
+Cada verificação de senha roda um PBKDF2 completo, que ocupa a CPU por dezenas
+de milissegundos. Num pico de logins isso prendia todos os workers e travava
+endpoints baratos. Aqui as verificações passam por um executor dedicado, com
+LOGIN_HASH_WORKERS threads (o hashlib libera o GIL durante o PBKDF2) e uma
+fila de no máximo LOGIN_HASH_QUEUE pedidos. Com a fila cheia, ou se a espera
+passar de LOGIN_HASH_TIMEOUT segundos, a requisição falha na hora com 503 em
+vez de esperar indefinidamente.
+
+O login é uma view assíncrona que aguarda o executor (`averificar_senha`) sem
+prender a thread do worker. Servido por ASGI (ex.: uvicorn), um processo
+recebe vários logins ao mesmo tempo e a fila é o que limita quantos esperam
+pelo hash. Sob WSGI sync cada processo atende uma requisição por vez e quem
+segura a carga é o número de workers.
+
+Para cadastros em lote (matrícula de uma turma inteira) o hash roda num pool
+de processos de longa duração, usando todos os núcleos.
+"""
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+from .throttling import ServicoSobrecarregado
+
+
+class HashingPool:
+    def __init__(self, workers, fila, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hashing")
+        # Vagas = executando + aguardando na fila
+        self.vagas = threading.BoundedSemaphore(workers + fila)
+
+    def _submeter(self, funcao, *args):
+        if not self.vagas.acquire(blocking=False):
+            raise ServicoSobrecarregado()
+        try:
+            future = self.executor.submit(funcao, *args)
+        except Exception:
+            self.vagas.release()
+            raise
+        future.add_done_callback(lambda _: self.vagas.release())
+        return future
+
+    def executar(self, funcao, *args):
+        """
+        Roda `funcao(*args)` no executor e devolve o resultado. Levanta
+        ServicoSobrecarregado se não houver vaga ou se a espera estourar o timeout.
+        """
+        future = self._submeter(funcao, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Se ainda estava na fila, não chega a rodar
+            future.cancel()
+            raise ServicoSobrecarregado()
+
+    async def executar_async(self, funcao, *args):
+        """
+        Como `executar`, mas aguarda o resultado no event loop, sem prender a
+        thread da requisição.
+        """
+        future = self._submeter(funcao, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # wait_for já cancelou o future; se estava na fila, não roda
+            raise ServicoSobrecarregado()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    settings.LOGIN_HASH_WORKERS,
+                    settings.LOGIN_HASH_QUEUE,
+                    settings.LOGIN_HASH_TIMEOUT,
+                )
+    return _pool
+
+
+def gerar_hash(senha):
+    return get_pool().executar(make_password, senha)
+
+
+async def averificar_senha(user, senha):
+    """
+    Equivalente a `user.check_password(senha)`, aguardando o hash no executor.
+    Se o hasher da senha estiver desatualizado, ela é regravada com o atual.
+    """
+    precisa_atualizar = []
+    correta = await get_pool().executar_async(
+        check_password, senha, user.password, precisa_atualizar.append
+    )
+    if precisa_atualizar:
+        user.password = await get_pool().executar_async(make_password, senha)
+        await sync_to_async(user.save)(update_fields=["password"])
+    return correta
+
+
+def _iniciar_processo():
+    # Com spawn (macOS/Windows) o processo filho começa sem o Django carregado
+    import django
+
+    django.setup()
+
+
+_processos = None
+_processos_lock = threading.Lock()
+
+
+def processos_de_hash():
+    """
+    Pool de processos da matrícula em lote. É criado na primeira matrícula e
+    reusado pelas seguintes: subir os processos (e o Django em cada um) a cada
+    requisição custava mais que o hash de uma turma pequena.
+    """
+    global _processos
+    if _processos is None:
+        with _processos_lock:
+            if _processos is None:
+                _processos = ProcessPoolExecutor(
+                    max_workers=settings.MATRICULA_HASH_PROCESSES,
+                    initializer=_iniciar_processo,
+                )
+    return _processos
+
+
+def _descartar_processos(executor):
+    global _processos
+    with _processos_lock:
+        if _processos is executor:
+            _processos = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def gerar_hashes(senhas):
+    """
+    Hash de várias senhas em paralelo no pool de processos, na mesma ordem
+    recebida. Se um processo do pool morreu (ex.: OOM), o pool é refeito e
+    o lote, tentado de novo uma vez.
+    """
+    senhas = list(senhas)
+    chunksize = max(1, len(senhas) // (settings.MATRICULA_HASH_PROCESSES * 4))
+    for tentativa in range(2):
+        executor = processos_de_hash()
+        try:
+            return list(executor.map(make_password, senhas, chunksize=chunksize))
+        except BrokenProcessPool:
+            _descartar_processos(executor)
+            if tentativa:
+                raise
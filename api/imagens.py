@@ -0,0 +1,164 @@
+"""
+Versões reduzidas das fotos enviadas (perfil e provas).
+
+O celular manda o original, muitas vezes com vários megabytes, rotacionado por
+EXIF e com metadados (inclusive localização). Depois do commit, cada foto nova
+gera as versões de TAMANHOS: orientação aplicada, metadados removidos e
+recodificadas em WebP. O trabalho de imagem roda num pool de processos
+(IMAGEM_PROCESSES), fora da requisição; o original fica como veio e serve de
+fonte para gerar as versões de novo (`manage.py gerar_miniaturas`).
+
+As versões ficam em `<pasta>/miniaturas/<nome>_<tamanho>.webp`, então a URL de
+cada tamanho sai do nome da foto, sem consulta.
+"""
+import io
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Maior lado, em pixels
+TAMANHOS = {"pequena": 160, "media": 480, "grande": 1280}
+QUALIDADE = 80
+
+
+_MINIATURA = re.compile(
+    r"^(?P<pasta>.+)/miniaturas/(?P<base>[^/]+)_(?:%s)\.webp$" % "|".join(TAMANHOS)
+)
+# Extensões possíveis do original de uma miniatura
+_EXTENSOES_ORIGINAL = [
+    variante
+    for extensao in (".jpg", ".jpeg", ".png", ".gif", ".webp")
+    for variante in (extensao, extensao.upper())
+]
+
+
+def nome_miniatura(nome, tamanho):
+    pasta, arquivo = os.path.split(nome)
+    base = os.path.splitext(arquivo)[0]
+    return os.path.join(pasta, "miniaturas", f"{base}_{tamanho}.webp")
+
+
+def originais(nome):
+    """
+    Nomes de foto a que `nome` pode corresponder: ele mesmo ou, se for uma
+    miniatura, os originais possíveis (a extensão não entra no nome dela).
+    """
+    miniatura = _MINIATURA.match(nome)
+    if not miniatura:
+        return [nome]
+    base = f"{miniatura['pasta']}/{miniatura['base']}"
+    return [base + extensao for extensao in _EXTENSOES_ORIGINAL]
+
+
+def urls_miniaturas(arquivo, request=None):
+    """
+    URL de cada tamanho da foto `arquivo` (um FieldFile), ou None sem foto.
+    """
+    if not arquivo:
+        return None
+    urls = {}
+    for tamanho in TAMANHOS:
+        url = arquivo.storage.url(nome_miniatura(arquivo.name, tamanho))
+        urls[tamanho] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def renderizar(conteudo):
+    """
+    Gera as versões de TAMANHOS a partir dos bytes da imagem original.
+    Roda no processo filho: só Pillow, nada de Django.
+    """
+    with Image.open(io.BytesIO(conteudo)) as original:
+        imagem = ImageOps.exif_transpose(original)
+        modo = "RGBA" if imagem.mode in ("RGBA", "LA", "P") else "RGB"
+        imagem = imagem.convert(modo)
+    versoes = {}
+    for tamanho, lado in TAMANHOS.items():
+        copia = imagem.copy()
+        copia.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        saida = io.BytesIO()
+        # Sem exif=/icc_profile=, o WebP sai sem metadados
+        copia.save(saida, "WEBP", quality=QUALIDADE, method=4)
+        versoes[tamanho] = saida.getvalue()
+    return versoes
+
+
+def gerar_miniaturas(arquivo, executor=None):
+    """
+    Gera e grava as versões da foto `arquivo` (um FieldFile). Com `executor`,
+    a imagem é processada nele; sem, no processo atual.
+    """
+    storage = arquivo.storage
+    with storage.open(arquivo.name, "rb") as origem:
+        conteudo = origem.read()
+    if executor is None:
+        versoes = renderizar(conteudo)
+    else:
+        versoes = executor.submit(renderizar, conteudo).result()
+    for tamanho, dados in versoes.items():
+        destino = nome_miniatura(arquivo.name, tamanho)
+        if storage.exists(destino):
+            storage.delete(destino)
+        storage.save(destino, ContentFile(dados))
+
+
+def miniaturas_faltando(arquivo):
+    return any(
+        not arquivo.storage.exists(nome_miniatura(arquivo.name, tamanho))
+        for tamanho in TAMANHOS
+    )
+
+
+_processos = None
+_threads = None
+_lock = threading.Lock()
+
+
+def _executores():
+    global _processos, _threads
+    if _processos is None:
+        with _lock:
+            if _processos is None:
+                # As threads só esperam o pool de processos e gravam o resultado
+                _threads = ThreadPoolExecutor(
+                    max_workers=settings.IMAGEM_PROCESSES, thread_name_prefix="miniaturas"
+                )
+                _processos = ProcessPoolExecutor(max_workers=settings.IMAGEM_PROCESSES)
+    return _threads, _processos
+
+
+def _gerar_em_segundo_plano(arquivo, executor):
+    try:
+        # A mesma foto pode já ter sido enviada antes (ver api.midia)
+        if miniaturas_faltando(arquivo):
+            gerar_miniaturas(arquivo, executor)
+    except Exception:
+        # O original continua salvo; `gerar_miniaturas` refaz as que faltarem
+        logger.exception("Falha ao gerar as miniaturas de %s", arquivo.name)
+
+
+def agendar_miniaturas(arquivo):
+    """
+    Agenda a geração das versões de `arquivo` para depois do commit. Com
+    IMAGEM_PROCESSES = 0 elas são geradas na hora, no próprio processo.
+    """
+    if not arquivo:
+        return
+
+    def agendar():
+        if not settings.IMAGEM_PROCESSES:
+            _gerar_em_segundo_plano(arquivo, None)
+            return
+        threads, processos = _executores()
+        threads.submit(_gerar_em_segundo_plano, arquivo, processos)
+
+    transaction.on_commit(agendar, robust=True)
@@ -0,0 +1,221 @@
+"""
+Importação em lote de conteúdos a partir de CSV ou JSONL.
+
+O arquivo é lido linha a linha e gravado em lotes (`bulk_create`), cada lote
+na sua própria transação, então a memória usada não depende do tamanho do
+arquivo. Cada linha é validada com as mesmas regras do ConteudoSerializer;
+linhas inválidas entram no relatório de erros e não interrompem a importação.
+Linhas com `id` atualizam o conteúdo existente (upsert); um `id` que não existe
+é um erro da linha.
+"""
+import codecs
+import csv
+import itertools
+import json
+
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from . import ranking, search
+from .cache import bump_catalog_version
+from .models import Conteudo
+from .serializers import ConteudoSerializer
+
+FORMATOS = ("csv", "jsonl")
+BATCH_SIZE = 1000
+MAX_ERROS = 1000
+CAMPOS = ["titulo", "tipo", "tema", "url", "duracao_estimada"]
+
+
+def detectar_formato(nome):
+    extensao = nome.rsplit(".", 1)[-1].lower() if "." in nome else ""
+    return extensao if extensao in FORMATOS else None
+
+
+def _linhas_csv(stream):
+    # strict: aspas mal fechadas viram erro em vez de um campo com o resto do arquivo
+    leitor = csv.DictReader(stream, strict=True)
+    try:
+        # Lê o cabeçalho antes, para a contagem de linhas partir dele
+        leitor.fieldnames
+    except csv.Error as exc:
+        yield 1, ValueError(f"Cabeçalho CSV inválido: {exc}")
+        return
+    while True:
+        inicio = leitor.line_num + 1
+        try:
+            linha = next(leitor)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            # O leitor segue a partir da linha seguinte
+            yield inicio, ValueError(f"CSV inválido: {exc}")
+            continue
+        yield leitor.line_num, {k: v for k, v in linha.items() if k and v not in (None, "")}
+
+
+def _linhas_jsonl(stream):
+    for numero, linha in enumerate(stream, start=1):
+        if not linha.strip():
+            continue
+        try:
+            dados = json.loads(linha)
+        except json.JSONDecodeError as exc:
+            yield numero, exc
+            continue
+        if not isinstance(dados, dict):
+            yield numero, ValueError("Cada linha deve ser um objeto JSON.")
+            continue
+        yield numero, dados
+
+
+def ler_linhas(stream, formato):
+    """
+    Itera (número da linha, dados) de um stream CSV ou JSONL. Linhas JSONL
+    inválidas vêm como (número, exceção) para entrarem no relatório de erros.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato não suportado: {formato}")
+    return _linhas_csv(stream) if formato == "csv" else _linhas_jsonl(stream)
+
+
+def _latin1(erro):
+    return erro.object[erro.start:erro.end].decode("latin-1"), erro.end
+
+
+codecs.register_error("api.importacao.latin1", _latin1)
+
+
+def abrir_texto(arquivo):
+    """
+    Linhas de texto de um arquivo binário (ex.: upload), sem carregá-lo
+    inteiro. Lê UTF-8 (com ou sem BOM); na primeira linha que não for UTF-8
+    válido passa a ler como Windows-1252, o CSV que o Excel exporta.
+    """
+    codificacao = "utf-8"
+    for numero, linha in enumerate(arquivo):
+        if numero == 0 and linha.startswith(codecs.BOM_UTF8):
+            linha = linha[len(codecs.BOM_UTF8):]
+        if codificacao == "utf-8":
+            try:
+                yield linha.decode("utf-8")
+                continue
+            except UnicodeDecodeError:
+                codificacao = "cp1252"
+        # Os poucos bytes sem caractere no cp1252 ficam como no latin-1
+        yield linha.decode(codificacao, errors="api.importacao.latin1")
+
+
+VERDADEIROS = {"1", "true", "t", "sim", "s", "yes", "y", "verdadeiro"}
+FALSOS = {"0", "false", "f", "nao", "não", "n", "no", "falso"}
+
+
+def _inteiro(valor):
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str) and valor.strip().isdigit():
+        return int(valor.strip())
+    raise serializers.ValidationError({"id": ["Informe um número inteiro."]})
+
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, int) and valor in (0, 1):
+        return bool(valor)
+    if isinstance(valor, str):
+        texto = valor.strip().lower()
+        if texto in VERDADEIROS:
+            return True
+        if texto in FALSOS:
+            return False
+    raise serializers.ValidationError({"is_active": ["Use true ou false."]})
+
+
+def _validar(validador, dados):
+    pk = dados.get("id")
+    pk = None if pk in (None, "") else _inteiro(pk)
+    is_active = _booleano(dados.get("is_active", True))
+    validado = validador.run_validation({k: dados[k] for k in CAMPOS if k in dados})
+    return Conteudo(pk=pk, is_active=is_active, **validado)
+
+
+def importar_conteudos(stream, formato, batch_size=BATCH_SIZE):
+    """
+    Importa conteúdos de um stream de texto. Retorna um relatório com os totais
+    e os erros por linha (limitados a MAX_ERROS).
+    """
+    linhas = ler_linhas(stream, formato)
+    # Um único serializer reaproveitado: instanciar um por linha custa caro
+    validador = ConteudoSerializer()
+    relatorio = {"criados": 0, "atualizados": 0, "com_erro": 0, "erros": []}
+
+    def registrar_erro(numero, erros):
+        relatorio["com_erro"] += 1
+        if len(relatorio["erros"]) < MAX_ERROS:
+            relatorio["erros"].append({"linha": numero, "erros": erros})
+
+    while True:
+        lote = list(itertools.islice(linhas, batch_size))
+        if not lote:
+            break
+        validos = []
+        for numero, dados in lote:
+            if isinstance(dados, Exception):
+                registrar_erro(numero, {"linha": [str(dados)]})
+                continue
+            try:
+                validos.append((numero, _validar(validador, dados)))
+            except serializers.ValidationError as exc:
+                registrar_erro(numero, exc.detail)
+        if not validos:
+            continue
+        try:
+            criados, atualizados, desconhecidos = _gravar_lote(validos)
+        except DatabaseError as exc:
+            for numero, _ in validos:
+                registrar_erro(numero, {"banco": [str(exc)]})
+            continue
+        for numero in desconhecidos:
+            registrar_erro(numero, {"id": ["Não existe conteúdo com este id."]})
+        relatorio["criados"] += criados
+        relatorio["atualizados"] += atualizados
+    return relatorio
+
+
+@transaction.atomic
+def _gravar_lote(validos):
+    """
+    Grava um lote de (número da linha, Conteudo). Linhas com `id` só atualizam
+    conteúdos que já existem: inserir um id explícito deixaria a sequência do
+    banco (Postgres) para trás e os próximos cadastros colidiriam com ele.
+    Retorna (criados, atualizados, números das linhas com id desconhecido).
+    """
+    existentes = set(
+        Conteudo.objects.select_for_update()
+        .filter(pk__in=[c.pk for _, c in validos if c.pk is not None])
+        .values_list("pk", flat=True)
+    )
+    desconhecidos = [n for n, c in validos if c.pk is not None and c.pk not in existentes]
+    # O mesmo id repetido no lote: vale a última linha
+    por_id = {c.pk: c for _, c in validos if c.pk in existentes}
+    novos = [c for _, c in validos if c.pk is None]
+    com_id = list(por_id.values())
+    Conteudo.objects.bulk_create(novos)
+    if com_id:
+        Conteudo.objects.bulk_create(
+            com_id,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=CAMPOS + ["is_active", "atualizado_em"],
+        )
+    conteudos = novos + com_id
+    # bulk_create não dispara sinais: atualiza índice de busca e ranking aqui
+    search.index_conteudos(conteudos)
+    ranking.add_new_conteudos([c.pk for c in novos])
+    ranking.refresh_conteudos(com_id)
+    # A cada lote confirmado, não só no fim: se a importação parar no meio, os
+    # lotes já gravados não podem ficar de fora do catálogo em cache
+    if conteudos:
+        transaction.on_commit(bump_catalog_version)
+    return len(novos), len(com_id), desconhecidos
@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import usuarios_por_email
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o custo da busca de usuário por email conforme a tabela cresce "
+        "(padrão: até 1.000.000 de usuários). Os usuários são criados numa "
+        "transação desfeita no final; nada fica gravado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--lookups", type=int, default=2000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'usuários':>10} {'por email (µs)':>15}")
+        try:
+            with transaction.atomic():
+                self._medir(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _medir(self, options):
+        senha = make_password(None)
+        inicial = User.objects.count()
+        criados = 0
+        for tamanho in sorted(options["sizes"]):
+            while criados < tamanho:
+                lote = min(options["batch_size"], tamanho - criados)
+                User.objects.bulk_create(
+                    User(
+                        username=f"benchmark-{i}",
+                        email=f"Benchmark.{i}@Example.com",
+                        password=senha,
+                    )
+                    for i in range(criados, criados + lote)
+                )
+                criados += lote
+            passo = max(1, criados // options["lookups"])
+            emails = [f"benchmark.{i}@example.com" for i in range(0, criados, passo)]
+            inicio = time.perf_counter()
+            for email in emails:
+                usuarios_por_email(email).first()
+            duracao = time.perf_counter() - inicio
+            self.stdout.write(
+                f"{inicial + criados:>10} {duracao / len(emails) * 1_000_000:>15.1f}"
+            )
@@ -0,0 +1,106 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from api import hashing
+from api.throttling import ServicoSobrecarregado
+
+
+def percentil(valores, p):
+    if not valores:
+        return float("nan")
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p99) e vazão do login com diferentes números de "
+        "threads de hash. Sem --email, mede só a verificação de senha; com "
+        "--email/--password, faz POSTs reais em /api/login/ contra o banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 2]
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--queue", type=int, default=settings.LOGIN_HASH_QUEUE)
+        parser.add_argument("--timeout", type=float, default=settings.LOGIN_HASH_TIMEOUT)
+        parser.add_argument("--email")
+        parser.add_argument("--password", default="Senha123")
+
+    def handle(self, *args, **options):
+        if options["email"]:
+            requisicao = self._login_http(options["email"], options["password"])
+        else:
+            requisicao = self._verificacao(options["password"])
+
+        self.stdout.write(
+            f"{'workers':>8} {'p50 (ms)':>10} {'p99 (ms)':>10} {'logins/s':>10} {'503':>6}"
+        )
+        for workers in sorted(set(options["workers"])):
+            pool = hashing.HashingPool(workers, options["queue"], options["timeout"])
+            anterior, hashing._pool = hashing._pool, pool
+            try:
+                latencias, rejeitados, duracao = self._rodar(
+                    requisicao, options["requests"], options["concurrency"]
+                )
+            finally:
+                hashing._pool = anterior
+                pool.shutdown()
+            self.stdout.write(
+                f"{workers:>8} {percentil(latencias, 50) * 1000:>10.1f} "
+                f"{percentil(latencias, 99) * 1000:>10.1f} "
+                f"{len(latencias) / duracao:>10.1f} {rejeitados:>6}"
+            )
+
+    def _verificacao(self, senha):
+        encoded = make_password(senha)
+
+        def requisicao():
+            try:
+                hashing.get_pool().executar(check_password, senha, encoded)
+            except ServicoSobrecarregado:
+                return False
+            return True
+
+        return requisicao
+
+    def _login_http(self, email, senha):
+        def requisicao():
+            try:
+                resposta = Client().post(
+                    "/api/login/",
+                    {"email": email, "password": senha},
+                    content_type="application/json",
+                )
+            finally:
+                connection.close()
+            if resposta.status_code == 503:
+                return False
+            if resposta.status_code != 200:
+                raise RuntimeError(f"Login falhou ({resposta.status_code}): {resposta.content!r}")
+            return True
+
+        return requisicao
+
+    def _rodar(self, requisicao, total, concurrency):
+        def medir(_):
+            inicio = time.perf_counter()
+            ok = requisicao()
+            return ok, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clientes:
+            resultados = list(clientes.map(medir, range(total)))
+        duracao = time.perf_counter() - inicio
+        latencias = [latencia for ok, latencia in resultados if ok]
+        return latencias, len(resultados) - len(latencias), duracao
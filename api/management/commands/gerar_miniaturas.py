@@ -0,0 +1,63 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.imagens import gerar_miniaturas, miniaturas_faltando
+from api.models import PerfilUsuario, Prova
+
+LOTE = 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as miniaturas das fotos de perfil e de provas que ainda não as "
+        "têm (ex.: fotos enviadas antes das miniaturas existirem, ou cuja "
+        "geração falhou). Use --todas para refazer todas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--todas", action="store_true")
+
+    def handle(self, *args, **options):
+        fotos = itertools.chain(
+            (
+                prova.foto
+                for prova in Prova.objects.exclude(foto="").exclude(foto__isnull=True)
+                .only("pk", "foto").iterator(chunk_size=LOTE)
+            ),
+            (
+                perfil.fotoPerfil
+                for perfil in PerfilUsuario.objects.exclude(fotoPerfil="")
+                .exclude(fotoPerfil__isnull=True)
+                .only("pk", "fotoPerfil").iterator(chunk_size=LOTE)
+            ),
+        )
+        if not options["todas"]:
+            fotos = (foto for foto in fotos if miniaturas_faltando(foto))
+
+        workers = max(1, settings.IMAGEM_PROCESSES)
+        geradas = falhas = 0
+        with ProcessPoolExecutor(max_workers=workers) as processos, ThreadPoolExecutor(
+            max_workers=workers
+        ) as threads:
+            while True:
+                lote = list(itertools.islice(fotos, LOTE))
+                if not lote:
+                    break
+                futures = [
+                    (foto, threads.submit(gerar_miniaturas, foto, processos)) for foto in lote
+                ]
+                for foto, future in futures:
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        falhas += 1
+                        self.stderr.write(f"{foto.name}: {exc}")
+                    else:
+                        geradas += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"{geradas} fotos processadas, {falhas} com falha.")
+        )
+
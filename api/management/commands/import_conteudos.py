@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importacao import BATCH_SIZE, FORMATOS, abrir_texto, detectar_formato, importar_conteudos
+
+
+class Command(BaseCommand):
+    help = "Importa conteúdos em lote de um arquivo CSV ou JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo")
+        parser.add_argument("--format", choices=FORMATOS, dest="formato")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        formato = options["formato"] or detectar_formato(options["arquivo"])
+        if formato is None:
+            raise CommandError("Não foi possível detectar o formato; use --format.")
+        try:
+            with open(options["arquivo"], "rb") as arquivo:
+                relatorio = importar_conteudos(
+                    abrir_texto(arquivo), formato, batch_size=options["batch_size"]
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for erro in relatorio["erros"]:
+            self.stderr.write(f"Linha {erro['linha']}: {json.dumps(erro['erros'], ensure_ascii=False)}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{relatorio['criados']} criados, {relatorio['atualizados']} atualizados, "
+                f"{relatorio['com_erro']} com erro."
+            )
+        )
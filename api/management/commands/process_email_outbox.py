@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.outbox import BATCH_SIZE, processar_lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Envia os emails da fila de saída (EmailPendente), em lotes, com "
+        "novas tentativas e backoff para as falhas. Roda continuamente; use "
+        "--once para processar o que estiver pendente e sair."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--interval", type=float, default=2.0,
+            help="Segundos de espera quando a fila está vazia.",
+        )
+        parser.add_argument("--once", action="store_true")
+
+    def handle(self, *args, **options):
+        total_enviados = total_falhas = 0
+        try:
+            while True:
+                close_old_connections()
+                enviados, falhas = processar_lote(options["batch_size"])
+                total_enviados += enviados
+                total_falhas += falhas
+                if enviados or falhas:
+                    self.stdout.write(f"{enviados} enviados, {falhas} com falha.")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            self.style.SUCCESS(f"Total: {total_enviados} enviados, {total_falhas} com falha.")
+        )
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove da fila de saída os emails já enviados ou descartados, em lotes. "
+        "Agende para rodar periodicamente (ex.: uma vez por dia, via cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias", type=int, default=7,
+            help="Mantém os emails finalizados dos últimos N dias (padrão: 7).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(days=options["dias"])
+        total = outbox.purgar(antes_de, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{total} emails finalizados removidos."))
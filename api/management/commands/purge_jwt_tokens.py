@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove os refresh tokens expirados (e suas entradas na blacklist), em "
+        "lotes. Agende para rodar periodicamente (ex.: uma vez por dia, via cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        agora = timezone.now()
+        total = 0
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=agora)
+                .order_by("expires_at")
+                .values_list("pk", flat=True)[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            OutstandingToken.objects.filter(pk__in=ids).delete()
+            total += len(ids)
+        self.stdout.write(self.style.SUCCESS(f"{total} tokens expirados removidos."))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.midia import LOTE, orfas, remover_orfa
+
+
+class Command(BaseCommand):
+    help = (
+        "Apaga os arquivos de mídia que nenhuma prova ou perfil usa (fotos "
+        "trocadas ou excluídas, uploads de transações desfeitas), depois de um "
+        "período de carência e num ritmo limitado de exclusões. Use --dry-run "
+        "para só listar. Agende para rodar periodicamente (ex.: uma vez por dia)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument(
+            "--grace-hours", type=float, default=24,
+            help="Só apaga arquivos gravados há mais que isso.",
+        )
+        parser.add_argument(
+            "--max-per-second", type=float, default=20,
+            help="Limite de arquivos apagados por segundo, para não disputar o disco.",
+        )
+        parser.add_argument("--batch-size", type=int, default=LOTE)
+
+    def handle(self, *args, **options):
+        intervalo = 1 / options["max_per_second"] if options["max_per_second"] > 0 else 0
+        apagados = bytes_apagados = 0
+        for nome, tamanho in orfas(
+            default_storage, options["grace_hours"] * 60 * 60, options["batch_size"]
+        ):
+            if options["dry_run"]:
+                self.stdout.write(f"{nome} ({tamanho} bytes)")
+            else:
+                if not remover_orfa(nome):
+                    continue
+                time.sleep(intervalo)
+            apagados += 1
+            bytes_apagados += tamanho
+        acao = "seriam apagados" if options["dry_run"] else "apagados"
+        self.stdout.write(
+            self.style.SUCCESS(f"{apagados} arquivos sem uso {acao} ({bytes_apagados} bytes).")
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import PasswordResetToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove os códigos de redefinição de senha expirados, em lotes. "
+        "Agende para rodar periodicamente (ex.: a cada hora, via cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        agora = timezone.now()
+        total = 0
+        while True:
+            ids = list(
+                PasswordResetToken.objects.filter(expires_at__lt=agora)
+                .order_by("expires_at")
+                .values_list("pk", flat=True)[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            total += PasswordResetToken.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{total} códigos expirados removidos."))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from api.models import Avaliacao, Conteudo, ConteudoEstatisticas
+
+CAMPOS = [
+    "total_avaliacoes",
+    "total_notas",
+    "soma_notas",
+    *(f"nota_{nota}" for nota in range(1, 6)),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula do zero os agregados de avaliações (ConteudoEstatisticas) "
+        "de todos os conteúdos, em lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ultimo_id = 0
+        total = 0
+        while True:
+            ids = list(
+                Conteudo.objects.filter(pk__gt=ultimo_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            self.rebuild(ids)
+            ultimo_id = ids[-1]
+            total += len(ids)
+        self.stdout.write(self.style.SUCCESS(f"Estatísticas recalculadas para {total} conteúdos."))
+
+    @transaction.atomic
+    def rebuild(self, ids):
+        agregados = {
+            linha.pop("conteudo_id"): linha
+            for linha in Avaliacao.objects.filter(conteudo_id__in=ids)
+            .values("conteudo_id")
+            .order_by()
+            .annotate(
+                total_avaliacoes=Count("id"),
+                total_notas=Count("nota"),
+                soma_notas=Sum("nota", default=0),
+                **{f"nota_{n}": Count("id", filter=Q(nota=n)) for n in range(1, 6)},
+            )
+        }
+        ConteudoEstatisticas.objects.bulk_create(
+            [
+                ConteudoEstatisticas(conteudo_id=pk, **agregados.get(pk, {}))
+                for pk in ids
+            ],
+            update_conflicts=True,
+            unique_fields=["conteudo"],
+            update_fields=CAMPOS,
+        )
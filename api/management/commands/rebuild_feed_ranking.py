@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import ranking
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o ranking pré-calculado do feed personalizado de conteúdos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = ranking.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Ranking reconstruído para {total} conteúdos."))
@@ -0,0 +1,129 @@
+"""
+Matrícula em lote: cadastra uma turma inteira a partir de uma lista de alunos
+(CSV, JSONL ou JSON) com as colunas username, email, password e, opcionalmente,
+serie_atual.
+
+As linhas são validadas com as regras do cadastro e processadas em lotes. Em
+cada lote a unicidade de username e email é conferida com uma consulta só, as
+senhas passam pelo hash em paralelo num pool de processos e usuários e perfis
+são gravados com `bulk_create`, numa transação. Linhas inválidas entram no
+relatório de erros e não interrompem a matrícula.
+"""
+import itertools
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from .hashing import gerar_hashes
+from .importacao import MAX_ERROS
+from .models import PerfilUsuario, normalizar_email
+from .serializers import MatriculaAlunoSerializer
+
+BATCH_SIZE = 500
+
+
+def matricular_alunos(linhas, batch_size=BATCH_SIZE):
+    """
+    Cadastra os alunos de `linhas`, um iterável de (número da linha, dados).
+    Retorna um relatório com os totais e os erros por linha.
+    """
+    validador = MatriculaAlunoSerializer()
+    relatorio = {"criados": 0, "com_erro": 0, "erros": []}
+    # Usernames e emails já usados por linhas anteriores do mesmo arquivo
+    vistos = {"username": set(), "email": set()}
+
+    def registrar_erro(numero, erros):
+        relatorio["com_erro"] += 1
+        if len(relatorio["erros"]) < MAX_ERROS:
+            relatorio["erros"].append({"linha": numero, "erros": erros})
+
+    linhas = iter(linhas)
+    while True:
+        lote = list(itertools.islice(linhas, batch_size))
+        if not lote:
+            break
+        alunos = []
+        for numero, dados in lote:
+            if isinstance(dados, Exception):
+                registrar_erro(numero, {"linha": [str(dados)]})
+                continue
+            try:
+                alunos.append((numero, validador.run_validation(dados)))
+            except serializers.ValidationError as exc:
+                registrar_erro(numero, exc.detail)
+
+        existentes = _existentes(alunos)
+        validos = []
+        for numero, aluno in alunos:
+            erros = {
+                campo: [mensagem]
+                for campo, mensagem in _DUPLICADO.items()
+                if aluno[campo] in existentes[campo] or aluno[campo] in vistos[campo]
+            }
+            if erros:
+                registrar_erro(numero, erros)
+                continue
+            for campo in vistos:
+                vistos[campo].add(aluno[campo])
+            validos.append((numero, aluno))
+        if not validos:
+            continue
+
+        senhas = gerar_hashes([aluno["password"] for _, aluno in validos])
+        try:
+            _gravar_lote([aluno for _, aluno in validos], senhas)
+        except DatabaseError as exc:
+            for numero, _ in validos:
+                registrar_erro(numero, {"banco": [str(exc)]})
+            continue
+        relatorio["criados"] += len(validos)
+    return relatorio
+
+
+_DUPLICADO = {
+    "username": "Este nome de usuário já está em uso.",
+    "email": "Este email já está cadastrado.",
+}
+
+
+def _existentes(alunos):
+    usernames = {aluno["username"] for _, aluno in alunos}
+    emails = {aluno["email"] for _, aluno in alunos}
+    encontrados = User.objects.filter(username__in=usernames) | User.objects.filter(
+        email__normalizado__in=emails
+    )
+    existentes = {"username": set(), "email": set()}
+    for username, email in encontrados.values_list("username", "email"):
+        existentes["username"].add(username)
+        existentes["email"].add(normalizar_email(email))
+    return existentes
+
+
+@transaction.atomic
+def _gravar_lote(alunos, senhas):
+    usuarios = User.objects.bulk_create(
+        [
+            User(
+                username=aluno["username"],
+                email=aluno["email"],
+                password=senha,
+            )
+            for aluno, senha in zip(alunos, senhas)
+        ]
+    )
+    if any(usuario.pk is None for usuario in usuarios):
+        # Bancos sem RETURNING no INSERT em lote: busca os ids pelo username
+        ids = dict(
+            User.objects.filter(
+                username__in=[usuario.username for usuario in usuarios]
+            ).values_list("username", "pk")
+        )
+        for usuario in usuarios:
+            usuario.pk = ids[usuario.username]
+    PerfilUsuario.objects.bulk_create(
+        [
+            PerfilUsuario(user=usuario, serie_atual=aluno.get("serie_atual"))
+            for usuario, aluno in zip(usuarios, alunos)
+        ]
+    )
@@ -0,0 +1,262 @@
+"""
+Fotos gravadas pelo conteúdo, com contagem de referências.
+
+Cada foto enviada vai para `images/midia/<xx>/<sha256>.<ext>`, com o SHA-256
+dos bytes (já calculado no upload, ver api.uploads). Se o mesmo conteúdo já
+existe, nada é gravado de novo: a prova ou o perfil só passam a apontar para
+o mesmo arquivo e Midia.referencias aumenta. As miniaturas (api.imagens) saem
+do nome, então também são compartilhadas.
+
+As fotos enviadas direto ao storage (ver api.uploads) chegam numa chave
+temporária e passam para o mesmo nome por conteúdo em `guardar_enviado`.
+
+Quem deixa de usar uma foto (troca, exclusão da prova ou do perfil, inclusive
+em cascata) chama `liberar`, que só diminui a contagem. Os arquivos sem uso,
+inclusive os que sobraram de transações desfeitas ou de uploads antigos, são
+apagados por `manage.py purge_media`, fora das requisições.
+"""
+import hashlib
+import heapq
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from .armazenamento import mover
+from .imagens import originais
+from .models import Midia, PerfilUsuario, Prova
+
+PASTA = "images/midia"
+EXTENSOES = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+LOTE = 500
+
+
+def nome_por_conteudo(arquivo):
+    sha256 = getattr(arquivo, "sha256", None) or _sha256(arquivo)
+    extensao = EXTENSOES.get(getattr(arquivo, "formato", None))
+    if extensao is None:
+        extensao = os.path.splitext(arquivo.name)[1].lower()
+    return f"{PASTA}/{sha256[:2]}/{sha256}{extensao}"
+
+
+def _sha256(arquivo):
+    hash = hashlib.sha256()
+    for bloco in arquivo.chunks():
+        hash.update(bloco)
+    arquivo.seek(0)
+    return hash.hexdigest()
+
+
+def guardar(arquivo, storage=default_storage):
+    """
+    Grava `arquivo` (um UploadedFile) pelo conteúdo e conta uma referência.
+    Retorna o nome no storage, para atribuir ao campo da foto.
+    """
+    nome = nome_por_conteudo(arquivo)
+    with transaction.atomic():
+        registrar(nome, arquivo.size)
+        # Com a linha travada pela transação, só esta requisição grava o arquivo
+        if not storage.exists(nome):
+            salvo = storage.save(nome, arquivo)
+            if salvo != nome:
+                raise IntegrityError(f"Midia gravada como {salvo}, esperado {nome}")
+    return nome
+
+
+def guardar_enviado(chave, nome, storage=default_storage):
+    """
+    Como `guardar`, para um arquivo que o cliente já enviou direto ao storage
+    em `chave` (ver api.armazenamento): ele passa para `nome`, ou é apagado se
+    o conteúdo já estava lá.
+    """
+    with transaction.atomic():
+        registrar(nome, storage.size(chave))
+        if storage.exists(nome):
+            storage.delete(chave)
+        else:
+            mover(storage, chave, nome)
+    return nome
+
+
+def registrar(nome, tamanho):
+    """
+    Conta uma referência a `nome`, criando a linha de Midia se preciso. Chame
+    dentro de uma transação: a linha fica travada até o fim dela.
+    """
+    while True:
+        try:
+            with transaction.atomic():
+                Midia.objects.create(nome=nome, tamanho=tamanho, referencias=1)
+            return
+        except IntegrityError:
+            # Já existe: mais uma referência. Se a linha sumiu entre o
+            # INSERT e o UPDATE (liberada por outra requisição), tenta de novo
+            if Midia.objects.filter(nome=nome).update(referencias=F("referencias") + 1):
+                return
+
+
+def liberar(nome):
+    """
+    Tira uma referência de `nome`. O arquivo fica no disco até o
+    `manage.py purge_media`, fora da requisição.
+    """
+    if not nome:
+        return
+    Midia.objects.filter(nome=nome, referencias__gt=0).update(
+        referencias=F("referencias") - 1
+    )
+
+
+# Coleta de lixo (manage.py purge_media)
+
+
+def _chave_de_ordem(campo):
+    # O merge de nomes_em_uso compara os nomes na ordem do Python (por code
+    # point). No PostgreSQL a collation do banco (ex.: pt_BR.UTF-8) ordena de
+    # outro jeito; "C" ordena pelos bytes do UTF-8, que é a mesma ordem, e tem
+    # índice próprio (migração 0025). O SQLite já compara byte a byte.
+    if connection.vendor == "postgresql":
+        return Collate(campo, "C")
+    return F(campo)
+
+
+def _nomes_da_coluna(queryset, campo, lote):
+    ultimo = ""
+    queryset = queryset.annotate(chave=_chave_de_ordem(campo))
+    while True:
+        # Paginação pelo próprio nome (indexado): um lote por consulta
+        nomes = list(
+            queryset.filter(chave__gt=ultimo)
+            .order_by("chave")
+            .values_list("chave", flat=True)
+            .distinct()[:lote]
+        )
+        if not nomes:
+            return
+        for nome in nomes:
+            if nome < ultimo:
+                # O merge abaixo depende da mesma ordem do Python
+                raise RuntimeError(
+                    f"A ordenação de {campo} no banco não é por código (collation)."
+                )
+            ultimo = nome
+            yield nome
+
+
+def nomes_em_uso(lote=LOTE):
+    """
+    Nomes de foto usados por provas, perfis ou com referências em Midia, em
+    ordem e sem repetição, lidos em lotes.
+    """
+    fluxos = [
+        _nomes_da_coluna(Prova.objects.all(), "foto", lote),
+        _nomes_da_coluna(PerfilUsuario.objects.all(), "fotoPerfil", lote),
+        _nomes_da_coluna(Midia.objects.filter(referencias__gt=0), "nome", lote),
+    ]
+    anterior = None
+    for nome in heapq.merge(*fluxos):
+        if nome != anterior:
+            yield nome
+            anterior = nome
+
+
+def em_uso(nomes):
+    nomes = list(nomes)
+    return (
+        set(Prova.objects.filter(foto__in=nomes).values_list("foto", flat=True))
+        | set(PerfilUsuario.objects.filter(fotoPerfil__in=nomes).values_list("fotoPerfil", flat=True))
+        | set(Midia.objects.filter(nome__in=nomes, referencias__gt=0).values_list("nome", flat=True))
+    )
+
+
+def arquivos(raiz):
+    """
+    (nome relativo, os.DirEntry) de cada arquivo sob `raiz`, na ordem
+    lexicográfica do nome. Só uma pasta por nível fica em memória.
+    """
+
+    def percorrer(pasta, prefixo):
+        with os.scandir(pasta) as entradas:
+            # "x/" em vez de "x" deixa cada pasta na posição dos nomes dos seus arquivos
+            entradas = sorted(
+                entradas,
+                key=lambda e: e.name + "/" if e.is_dir(follow_symlinks=False) else e.name,
+            )
+        for entrada in entradas:
+            nome = prefixo + entrada.name
+            if entrada.is_dir(follow_symlinks=False):
+                yield from percorrer(entrada.path, nome + "/")
+            else:
+                yield nome, entrada
+
+    if os.path.isdir(raiz):
+        yield from percorrer(raiz, "")
+
+
+def listar(storage):
+    """
+    (nome, tamanho, mtime) de cada arquivo do storage, em ordem de nome.
+    """
+    if hasattr(storage, "arquivos"):
+        # Ex.: S3Storage, que lista o bucket
+        yield from storage.arquivos()
+        return
+    for nome, entrada in arquivos(storage.location):
+        info = entrada.stat(follow_symlinks=False)
+        yield nome, info.st_size, info.st_mtime
+
+
+def orfas(storage, carencia, lote=LOTE):
+    """
+    (nome, tamanho) dos arquivos do `storage` que ninguém usa e foram gravados
+    há mais de `carencia` segundos. Compara a árvore e as colunas, ambas em
+    ordem, sem carregar nenhuma das duas inteira; as miniaturas são conferidas
+    pelos originais, em lotes.
+    """
+    limite = time.time() - carencia
+    usados = nomes_em_uso(lote)
+    proximo = next(usados, None)
+    miniaturas = []
+    for nome, tamanho, mtime in listar(storage):
+        if mtime > limite:
+            # Upload em andamento ou recente: a transação pode não ter terminado
+            continue
+        if originais(nome) != [nome]:
+            miniaturas.append((nome, tamanho))
+            if len(miniaturas) >= lote:
+                yield from _miniaturas_orfas(miniaturas)
+                miniaturas = []
+            continue
+        while proximo is not None and proximo < nome:
+            proximo = next(usados, None)
+        if proximo != nome:
+            yield nome, tamanho
+    yield from _miniaturas_orfas(miniaturas)
+
+
+def _miniaturas_orfas(miniaturas):
+    vivos = em_uso(
+        original for nome, _ in miniaturas for original in originais(nome)
+    )
+    for nome, tamanho in miniaturas:
+        if vivos.isdisjoint(originais(nome)):
+            yield nome, tamanho
+
+
+def remover_orfa(nome, storage=default_storage):
+    """
+    Apaga `nome` se continua sem uso. A linha de Midia fica travada até o fim,
+    então um `guardar` do mesmo conteúdo espera e, sem o arquivo, grava de novo.
+    """
+    candidatos = originais(nome)
+    with transaction.atomic():
+        list(Midia.objects.select_for_update().filter(nome__in=candidatos))
+        if em_uso(candidatos):
+            return False
+        if candidatos == [nome]:
+            Midia.objects.filter(nome=nome).delete()
+        storage.delete(nome)
+    return True
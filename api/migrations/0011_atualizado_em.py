@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_alter_perfilusuario_fotoperfil_alter_prova_foto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avaliacao',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='conteudo',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='prova',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,78 @@
+import unicodedata
+
+from django.db import migrations
+
+# SQL e normalização congelados nesta migração: ela não pode depender do
+# api.search atual, que pode mudar depois (novas colunas, outro esquema).
+SQLITE_TABLE = "api_conteudo_fts"
+POSTGRES_TABLE = "api_conteudo_busca"
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def create_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    Conteudo = apps.get_model("api", "Conteudo")
+    linhas = [
+        (pk, _normalize(titulo), _normalize(tema))
+        for pk, titulo, tema in Conteudo.objects.using(conn.alias)
+        .filter(is_active=True)
+        .values_list("pk", "titulo", "tema")
+        .iterator()
+    ]
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+                "USING fts5(titulo, tema, tokenize = 'unicode61')"
+            )
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} ({SQLITE_TABLE}, rank) "
+                "VALUES ('rank', 'bm25(10.0, 1.0)')"
+            )
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, titulo, tema) VALUES (%s, %s, %s)",
+                linhas,
+            )
+        elif conn.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+                " conteudo_id bigint PRIMARY KEY"
+                " REFERENCES api_conteudo (id) ON DELETE CASCADE"
+                " DEFERRABLE INITIALLY DEFERRED,"
+                " documento tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_documento_gin "
+                f"ON {POSTGRES_TABLE} USING gin (documento)"
+            )
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (conteudo_id, documento) VALUES ("
+                " %s, setweight(to_tsvector('simple', %s), 'A')"
+                " || setweight(to_tsvector('simple', %s), 'B'))"
+                " ON CONFLICT (conteudo_id) DO UPDATE SET documento = EXCLUDED.documento",
+                linhas,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+        elif conn.vendor == "postgresql":
+            cursor.execute(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
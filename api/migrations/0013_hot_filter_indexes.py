@@ -0,0 +1,62 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+# SQL congelado nesta migração: ela não pode depender do api.search atual
+SQLITE_TABLE = "api_conteudo_fts"
+POSTGRES_TABLE = "api_conteudo_busca"
+
+
+def configure_search_rank(apps, schema_editor):
+    # Recria (se preciso) o índice textual com a ordenação por rank configurada
+    conn = schema_editor.connection
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+                "USING fts5(titulo, tema, tokenize = 'unicode61')"
+            )
+            # Ordenar por `rank` deixa o próprio FTS5 ordenar, sem B-tree temporária
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} ({SQLITE_TABLE}, rank) "
+                "VALUES ('rank', 'bm25(10.0, 1.0)')"
+            )
+        elif conn.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+                " conteudo_id bigint PRIMARY KEY"
+                " REFERENCES api_conteudo (id) ON DELETE CASCADE"
+                " DEFERRABLE INITIALLY DEFERRED,"
+                " documento tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_documento_gin "
+                f"ON {POSTGRES_TABLE} USING gin (documento)"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_conteudo_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='avaliacao',
+            index=models.Index(fields=['user', 'data_avaliacao', 'id'], name='avaliacao_user_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conteudo',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['data_criacao', 'id'], name='conteudo_ativo_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresettoken',
+            index=models.Index(fields=['user', 'code'], name='reset_token_user_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prova',
+            index=models.Index(fields=['usuario', 'data', 'id'], name='prova_usuario_data_idx'),
+        ),
+        migrations.RunPython(configure_search_rank, migrations.RunPython.noop),
+    ]
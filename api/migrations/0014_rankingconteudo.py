@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingConteudo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segmento', models.CharField(max_length=32)),
+                ('score', models.FloatField()),
+                ('conteudo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.conteudo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['segmento', '-score'], name='ranking_segmento_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='rankingconteudo',
+            constraint=models.UniqueConstraint(fields=('segmento', 'conteudo'), name='ranking_segmento_conteudo_uniq'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def nota_numerica(texto):
+    """
+    A nota antiga (texto livre) como inteiro entre 1 e 5, ou None.
+    """
+    try:
+        valor = round(float(texto.replace(',', '.')))
+    except (ValueError, OverflowError):
+        # "abc" e "nan" dão ValueError; "inf", OverflowError
+        return None
+    return valor if 1 <= valor <= 5 else None
+
+
+def converter_notas(apps, schema_editor):
+    # Notas antigas eram texto livre; o que não for número entre 1 e 5 vira nulo
+    Avaliacao = apps.get_model('api', 'Avaliacao')
+    for avaliacao in Avaliacao.objects.exclude(nota='').only('pk', 'nota').iterator():
+        valor = nota_numerica(avaliacao.nota)
+        if valor is not None:
+            Avaliacao.objects.filter(pk=avaliacao.pk).update(nota_valor=valor)
+
+
+def preencher_estatisticas(apps, schema_editor):
+    Avaliacao = apps.get_model('api', 'Avaliacao')
+    ConteudoEstatisticas = apps.get_model('api', 'ConteudoEstatisticas')
+    agregados = Avaliacao.objects.values('conteudo_id').annotate(
+        total_avaliacoes=Count('id'),
+        total_notas=Count('nota'),
+        soma_notas=Sum('nota', default=0),
+        **{f'nota_{n}': Count('id', filter=Q(nota=n)) for n in range(1, 6)},
+    )
+    ConteudoEstatisticas.objects.bulk_create(
+        (ConteudoEstatisticas(**linha) for linha in agregados.order_by()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_rankingconteudo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='avaliacao',
+            name='nota_valor',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(converter_notas, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='avaliacao',
+            name='nota',
+        ),
+        migrations.RenameField(
+            model_name='avaliacao',
+            old_name='nota_valor',
+            new_name='nota',
+        ),
+        migrations.AlterField(
+            model_name='avaliacao',
+            name='nota',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddConstraint(
+            model_name='avaliacao',
+            constraint=models.CheckConstraint(check=models.Q(('nota__isnull', True), models.Q(('nota__gte', 1), ('nota__lte', 5)), _connector='OR'), name='avaliacao_nota_intervalo'),
+        ),
+        migrations.CreateModel(
+            name='ConteudoEstatisticas',
+            fields=[
+                ('conteudo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estatisticas', serialize=False, to='api.conteudo')),
+                ('total_avaliacoes', models.PositiveIntegerField(default=0)),
+                ('total_notas', models.PositiveIntegerField(default=0)),
+                ('soma_notas', models.PositiveIntegerField(default=0)),
+                ('nota_1', models.PositiveIntegerField(default=0)),
+                ('nota_2', models.PositiveIntegerField(default=0)),
+                ('nota_3', models.PositiveIntegerField(default=0)),
+                ('nota_4', models.PositiveIntegerField(default=0)),
+                ('nota_5', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(preencher_estatisticas, migrations.RunPython.noop),
+    ]
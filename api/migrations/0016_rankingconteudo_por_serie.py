@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+# Os segmentos passam de (preferências, série) para só a série, com o tipo do
+# conteúdo ao lado; as linhas antigas são refeitas pela 0023.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_avaliacao_nota_numerica_estatisticas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rankingconteudo',
+            name='tipo',
+            field=models.CharField(choices=[('Vídeo', 'Vídeo'), ('Texto', 'Texto'), ('Áudio', 'Áudio')], default='', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='rankingconteudo',
+            index=models.Index(fields=['segmento', 'tipo', '-score'], name='ranking_segmento_tipo_idx'),
+        ),
+    ]
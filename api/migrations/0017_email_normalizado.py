@@ -0,0 +1,50 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+
+
+def deduplicar_emails(apps, schema_editor):
+    # Não escolhe sozinha qual conta fica com o email: com repetidos, a
+    # migração para (e desfaz a normalização) listando as contas em conflito,
+    # para serem resolvidas à mão antes de rodar o migrate de novo
+    User = apps.get_model('auth', 'User')
+    User.objects.exclude(email='').update(email=Lower(Trim('email')))
+    duplicados = (
+        User.objects.exclude(email='')
+        .values('email')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('email', flat=True)
+    )
+    conflitos = {
+        email: list(User.objects.filter(email=email).order_by('id').values_list('id', flat=True))
+        for email in duplicados
+    }
+    if conflitos:
+        linhas = "\n".join(
+            f"  {email}: ids {', '.join(map(str, ids))}" for email, ids in sorted(conflitos.items())
+        )
+        raise RuntimeError(
+            "Há contas com o mesmo email (sem diferenciar maiúsculas nem espaços). "
+            "Deixe o email em só uma conta de cada grupo e rode o migrate de novo:\n"
+            + linhas
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('api', '0016_rankingconteudo_por_serie'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicar_emails, migrations.RunPython.noop),
+        # Mesma expressão do lookup `email__normalizado` (api.models); emails
+        # vazios viram NULL e ficam fora da unicidade
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_normalizado_uniq "
+            "ON auth_user ((NULLIF(LOWER(email), '')))",
+            "DROP INDEX auth_user_email_normalizado_uniq",
+        ),
+    ]
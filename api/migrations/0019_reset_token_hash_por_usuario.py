@@ -0,0 +1,57 @@
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+
+def hash_codigos(apps, schema_editor):
+    PasswordResetToken = apps.get_model('api', 'PasswordResetToken')
+    PasswordResetToken.objects.filter(expires_at__lt=timezone.now()).delete()
+    # Um código ativo por usuário: fica o mais recente
+    ultimo_por_usuario = {}
+    for token in PasswordResetToken.objects.order_by('user_id', '-created_at', '-id'):
+        if token.user_id in ultimo_por_usuario:
+            token.delete()
+            continue
+        ultimo_por_usuario[token.user_id] = token
+        # Mesmo HMAC de PasswordResetToken.hash_code
+        token.code = salted_hmac(
+            'api.PasswordResetToken', token.code, algorithm='sha256'
+        ).hexdigest()
+        token.save(update_fields=['code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_email_outbox'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='passwordresettoken',
+            name='reset_token_user_code_idx',
+        ),
+        migrations.AlterField(
+            model_name='passwordresettoken',
+            name='code',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.RunPython(hash_codigos, migrations.RunPython.noop),
+        migrations.RenameField(
+            model_name='passwordresettoken',
+            old_name='code',
+            new_name='code_hash',
+        ),
+        migrations.AddConstraint(
+            model_name='passwordresettoken',
+            constraint=models.UniqueConstraint(fields=('user',), name='reset_token_um_por_usuario'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresettoken',
+            index=models.Index(fields=['user', 'code_hash'], name='reset_token_user_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresettoken',
+            index=models.Index(fields=['expires_at'], name='reset_token_expira_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+        ('api', '0019_reset_token_hash_por_usuario'),
+    ]
+
+    operations = [
+        # A tabela é do simplejwt (token_blacklist), que não indexa expires_at;
+        # o índice serve à limpeza periódica (purge_jwt_tokens)
+        migrations.RunSQL(
+            "CREATE INDEX token_outstanding_expira_idx "
+            "ON token_blacklist_outstandingtoken (expires_at)",
+            "DROP INDEX token_outstanding_expira_idx",
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:31
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def registrar_fotos(apps, schema_editor):
+    Prova = apps.get_model('api', 'Prova')
+    PerfilUsuario = apps.get_model('api', 'PerfilUsuario')
+    Midia = apps.get_model('api', 'Midia')
+    # Fotos enviadas antes: cada nome conta as provas e perfis que o usam
+    referencias = Counter(
+        Prova.objects.exclude(foto='').exclude(foto__isnull=True)
+        .values_list('foto', flat=True).iterator()
+    )
+    referencias.update(
+        PerfilUsuario.objects.exclude(fotoPerfil='').exclude(fotoPerfil__isnull=True)
+        .values_list('fotoPerfil', flat=True).iterator()
+    )
+    Midia.objects.bulk_create(
+        [Midia(nome=nome, referencias=total) for nome, total in referencias.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_outstanding_token_expira_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Midia',
+            fields=[
+                ('nome', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('tamanho', models.BigIntegerField(blank=True, null=True)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(registrar_fotos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_midia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='perfilusuario',
+            index=models.Index(fields=['fotoPerfil'], name='perfil_foto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prova',
+            index=models.Index(fields=['foto'], name='prova_foto_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+import itertools
+import math
+from collections import defaultdict
+
+from django.db import migrations
+
+# Cópia congelada do cálculo de api.ranking na época desta migração: mudanças
+# futuras nos pesos valem só para quem rodar `manage.py rebuild_feed_ranking`.
+SERIES = ['1º Ano', '2º Ano', '3º Ano', None]
+NOTA_MAXIMA = 5
+PESO_PRIOR = 3
+MEDIA_PRIOR = 0.5
+PESO_SERIE = 1.0
+PESO_POPULARIDADE = 0.25
+LOTE = 500
+
+
+def _score(notas):
+    media = (sum(notas) + MEDIA_PRIOR * PESO_PRIOR) / (len(notas) + PESO_PRIOR)
+    return PESO_SERIE * media + PESO_POPULARIDADE * math.log1p(len(notas))
+
+
+def preencher_ranking(apps, schema_editor):
+    # O ranking é derivado: troca as linhas dos segmentos antigos (preferências
+    # e série, de antes da 0016) pelas dos segmentos por série; sem elas o feed
+    # "para mim" sai vazio para os conteúdos já cadastrados.
+    Avaliacao = apps.get_model('api', 'Avaliacao')
+    Conteudo = apps.get_model('api', 'Conteudo')
+    RankingConteudo = apps.get_model('api', 'RankingConteudo')
+    RankingConteudo.objects.all().delete()
+    conteudos = (
+        Conteudo.objects.filter(is_active=True).order_by('pk')
+        .values_list('pk', 'tipo').iterator(chunk_size=LOTE)
+    )
+    while True:
+        lote = list(itertools.islice(conteudos, LOTE))
+        if not lote:
+            return
+        notas = defaultdict(list)
+        avaliacoes = Avaliacao.objects.filter(
+            conteudo_id__in=[pk for pk, _ in lote], nota__isnull=False
+        ).values_list('conteudo_id', 'user__perfilusuario__serie_atual', 'nota')
+        for conteudo_id, serie, nota in avaliacoes:
+            notas[(conteudo_id, serie)].append(min(max(nota / NOTA_MAXIMA, 0.0), 1.0))
+        RankingConteudo.objects.bulk_create(
+            [
+                RankingConteudo(
+                    segmento=serie or '-',
+                    conteudo_id=pk,
+                    tipo=tipo,
+                    score=_score(notas.get((pk, serie), [])),
+                )
+                for pk, tipo in lote
+                for serie in SERIES
+            ],
+            batch_size=LOTE,
+        )
+
+
+def limpar_ranking(apps, schema_editor):
+    apps.get_model('api', 'RankingConteudo').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_foto_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_ranking, limpar_ranking),
+    ]
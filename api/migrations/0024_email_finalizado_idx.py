@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_rankingconteudo_preencher'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailpendente',
+            index=models.Index(condition=models.Q(('status', 'pendente'), _negated=True), fields=['criado_em'], name='email_finalizado_idx'),
+        ),
+    ]
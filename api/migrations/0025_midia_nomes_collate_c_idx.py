@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Só no PostgreSQL: a paginação de api.midia.nomes_em_uso ordena e compara os
+# nomes com COLLATE "C", que os índices na collation do banco não servem.
+# SQLite e outros bancos já usam os índices existentes.
+INDICES = [
+    ('prova_foto_c_idx', 'api_prova', 'foto'),
+    ('perfil_foto_c_idx', 'api_perfilusuario', 'fotoPerfil'),
+    ('midia_nome_c_idx', 'api_midia', 'nome'),
+]
+
+
+def criar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    for nome, tabela, coluna in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(nome)} '
+            f'ON {quote(tabela)} ({quote(coluna)} COLLATE "C")'
+        )
+
+
+def remover_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nome, _, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(nome)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_email_finalizado_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices, remover_indices),
+    ]
@@ -1,7 +1,33 @@
 # Create your models here.
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth.models import User
-import os
+from collections import Counter
+
+class EmailNormalizado(models.Transform):
+    """
+    `email__normalizado`: o email em minúsculas, com vazio virando NULL. É a
+    mesma expressão do índice único auth_user_email_normalizado_uniq (migração
+    0017), então as consultas por email usam o índice.
+    """
+    lookup_name = 'normalizado'
+    template = "NULLIF(LOWER(%(expressions)s), '')"
+
+
+models.EmailField.register_lookup(EmailNormalizado)
+
+
+def normalizar_email(email):
+    return (email or '').strip().lower()
+
+
+def usuarios_por_email(email):
+    """
+    Usuários com o email informado, sem diferenciar maiúsculas de minúsculas.
+    """
+    return User.objects.filter(email__normalizado=normalizar_email(email))
+
 
 class PerfilUsuario(models.Model):
     SERIE_CHOICES = [
@@ -15,6 +41,13 @@ class PerfilUsuario(models.Model):
     pref_leitura_escrita = models.BooleanField(default=False)
     serie_atual = models.CharField(max_length=10, choices=SERIE_CHOICES, blank=True, null=True)
     fotoPerfil = models.ImageField(upload_to='images/fotos_perfil/', null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Controle de acesso às fotos (api.entrega)
+            models.Index(fields=['fotoPerfil'], name='perfil_foto_idx'),
+        ]
 
     def __str__(self):
         return f"Perfil de {self.user.username}"
@@ -39,6 +72,17 @@ class Conteudo(models.Model):
     duracao_estimada = models.IntegerField(null=True, blank=True)
     data_criacao = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Catálogo ativo ordenado por (data_criacao, id), sem os inativos
+            models.Index(
+                fields=['data_criacao', 'id'],
+                condition=models.Q(is_active=True),
+                name='conteudo_ativo_criacao_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.titulo
@@ -50,40 +94,287 @@ class Prova(models.Model):
     foto = models.ImageField(upload_to='images/provas/', null=True, blank=True)
     descricao = models.TextField(blank=True)
     criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'data', 'id'], name='prova_usuario_data_idx'),
+            models.Index(fields=['foto'], name='prova_foto_idx'),
+        ]
+
     def __str__(self):
         return f"{self.titulo} - {self.usuario.username}"
-    def delete(self, *args, **kwargs):
-        if self.foto and os.path.exists(self.foto.path):
-            os.remove(self.foto.path)
-        super().delete(*args, **kwargs)
     
+# No módulo, e não só na classe, para o Meta de Avaliacao enxergar
+NOTA_MINIMA = 1
+NOTA_MAXIMA = 5
+
+
 class Avaliacao(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     conteudo = models.ForeignKey(Conteudo, on_delete=models.CASCADE)
-    nota = models.CharField(max_length=10,blank=True)
+    NOTA_MINIMA = NOTA_MINIMA
+    NOTA_MAXIMA = NOTA_MAXIMA
+    nota = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(NOTA_MINIMA), MaxValueValidator(NOTA_MAXIMA)],
+    )
     comentario = models.TextField(null=True, blank=True)
     data_avaliacao = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'data_avaliacao', 'id'], name='avaliacao_user_data_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(nota__isnull=True) | models.Q(nota__gte=NOTA_MINIMA, nota__lte=NOTA_MAXIMA),
+                name='avaliacao_nota_intervalo',
+            ),
+        ]
+
+    def _estado_atual(self):
+        nota = int(self.nota) if self.nota not in (None, '') else None
+        return (self.conteudo_id, nota)
+
+    def _estado_no_banco(self):
+        """
+        (conteudo_id, nota) gravados no banco, com a linha travada até o fim da
+        transação; None se a avaliação ainda não existe.
+        """
+        if self.pk is None:
+            return None
+        return (
+            Avaliacao.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list('conteudo_id', 'nota')
+            .first()
+        )
+
+    def save(self, *args, **kwargs):
+        # Os agregados de ConteudoEstatisticas são atualizados por sinal e
+        # precisam cair na mesma transação que a avaliação. O estado anterior
+        # vem do banco, e não da instância, que pode ter sido lida antes de
+        # outra requisição alterar a mesma avaliação.
+        with transaction.atomic():
+            self._estado_salvo = self._estado_no_banco()
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Avaliação de {self.user.username} para {self.conteudo.titulo}"
 
+
+class ConteudoEstatisticas(models.Model):
+    """
+    Agregados das avaliações de um conteúdo, mantidos incrementalmente a cada
+    avaliação criada, alterada ou removida (ver api.signals).
+    """
+    conteudo = models.OneToOneField(
+        Conteudo, on_delete=models.CASCADE, primary_key=True, related_name='estatisticas'
+    )
+    total_avaliacoes = models.PositiveIntegerField(default=0)
+    total_notas = models.PositiveIntegerField(default=0)
+    soma_notas = models.PositiveIntegerField(default=0)
+    nota_1 = models.PositiveIntegerField(default=0)
+    nota_2 = models.PositiveIntegerField(default=0)
+    nota_3 = models.PositiveIntegerField(default=0)
+    nota_4 = models.PositiveIntegerField(default=0)
+    nota_5 = models.PositiveIntegerField(default=0)
+
+    @property
+    def media(self):
+        if not self.total_notas:
+            return None
+        return self.soma_notas / self.total_notas
+
+    @property
+    def histograma(self):
+        return {nota: getattr(self, f'nota_{nota}') for nota in range(1, 6)}
+
+    @classmethod
+    def aplicar(cls, conteudo_id, nota, sinal):
+        """
+        Soma (sinal=1) ou subtrai (sinal=-1) uma avaliação dos agregados, com
+        um UPDATE atômico no banco para não perder escritas concorrentes.
+        """
+        campos = {'total_avaliacoes': F('total_avaliacoes') + sinal}
+        if nota is not None:
+            nota = int(nota)
+            campos['total_notas'] = F('total_notas') + sinal
+            campos['soma_notas'] = F('soma_notas') + sinal * nota
+            campos[f'nota_{nota}'] = F(f'nota_{nota}') + sinal
+        if not cls.objects.filter(conteudo_id=conteudo_id).update(**campos):
+            cls.objects.get_or_create(conteudo_id=conteudo_id)
+            cls.objects.filter(conteudo_id=conteudo_id).update(**campos)
+
+    @classmethod
+    def aplicar_lote(cls, avaliacoes):
+        """
+        Soma avaliações recém-criadas em lote (bulk_create não dispara sinais),
+        com um UPDATE por conteúdo.
+        """
+        por_conteudo = {}
+        for avaliacao in avaliacoes:
+            conteudo_id, nota = avaliacao._estado_atual()
+            contagem = por_conteudo.setdefault(conteudo_id, Counter())
+            contagem['total_avaliacoes'] += 1
+            if nota is not None:
+                contagem['total_notas'] += 1
+                contagem['soma_notas'] += nota
+                contagem[f'nota_{nota}'] += 1
+        for conteudo_id, contagem in por_conteudo.items():
+            campos = {campo: F(campo) + valor for campo, valor in contagem.items()}
+            if not cls.objects.filter(conteudo_id=conteudo_id).update(**campos):
+                cls.objects.get_or_create(conteudo_id=conteudo_id)
+                cls.objects.filter(conteudo_id=conteudo_id).update(**campos)
+
+    def __str__(self):
+        return f"Estatísticas de {self.conteudo_id}"
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.crypto import get_random_string, salted_hmac
 
 class PasswordResetToken(models.Model):
+    """
+    Código de redefinição de senha. Cada usuário tem no máximo um código
+    ativo (um novo pedido substitui o anterior) e o código é guardado como
+    HMAC, nunca em texto puro. Expirados são removidos por
+    `manage.py purge_reset_tokens`.
+    """
+    VALIDADE = timezone.timedelta(minutes=15)
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    code = models.CharField(max_length=6, unique=True, default=00000)
+    code_hash = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='reset_token_um_por_usuario'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'code_hash'], name='reset_token_user_code_idx'),
+            models.Index(fields=['expires_at'], name='reset_token_expira_idx'),
+        ]
+
+    @staticmethod
+    def hash_code(code):
+        return salted_hmac('api.PasswordResetToken', code, algorithm='sha256').hexdigest()
+
+    @classmethod
+    def emitir(cls, user):
+        """
+        Gera um código novo para o usuário, substituindo o anterior (upsert).
+        Retorna o código em texto puro, para ser enviado por email.
+        """
+        code = get_random_string(6, allowed_chars='0123456789')
+        agora = timezone.now()
+        cls.objects.bulk_create(
+            [cls(user=user, code_hash=cls.hash_code(code), created_at=agora, expires_at=agora + cls.VALIDADE)],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['code_hash', 'created_at', 'expires_at'],
+        )
+        return code
+
+    @classmethod
+    def buscar(cls, user, code):
+        return cls.objects.filter(user=user, code_hash=cls.hash_code(code)).first()
+
     def save(self, *args, **kwargs):
         if not self.expires_at:
-            self.expires_at = timezone.now() + timezone.timedelta(minutes=15)
+            self.expires_at = timezone.now() + self.VALIDADE
         super().save(*args, **kwargs)
 
     def is_valid(self):
         return timezone.now() <= self.expires_at
 
     def __str__(self):
-        return f"Token para {self.user.email}"
\ No newline at end of file
+        return f"Token para {self.user.email}"
+
+class RankingConteudo(models.Model):
+    """
+    Pontuação pré-calculada de um conteúdo para um segmento de alunos (série).
+    O tipo é copiado do conteúdo para o feed filtrar por preferência pelo
+    índice. Mantida por api.ranking.
+    """
+    segmento = models.CharField(max_length=32)
+    conteudo = models.ForeignKey(Conteudo, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=10, choices=Conteudo.TIPO_CHOICES)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['segmento', 'conteudo'], name='ranking_segmento_conteudo_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['segmento', '-score'], name='ranking_segmento_score_idx'),
+            models.Index(fields=['segmento', 'tipo', '-score'], name='ranking_segmento_tipo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.segmento} - {self.conteudo_id}: {self.score:.3f}"
+
+
+class EmailPendente(models.Model):
+    """
+    Fila de saída (outbox) de emails transacionais. A linha é gravada na
+    transação da requisição e enviada depois pelo worker
+    `manage.py process_email_outbox` (ver api.outbox).
+    """
+    PENDENTE = 'pendente'
+    ENVIADO = 'enviado'
+    FALHOU = 'falhou'
+    STATUS_CHOICES = [
+        (PENDENTE, 'Pendente'),
+        (ENVIADO, 'Enviado'),
+        (FALHOU, 'Falhou'),
+    ]
+    assunto = models.CharField(max_length=255)
+    mensagem = models.TextField()
+    remetente = models.CharField(max_length=255)
+    destinatarios = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDENTE)
+    tentativas = models.PositiveIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    ultimo_erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # O worker só lê os pendentes, pela ordem da próxima tentativa
+            models.Index(
+                fields=['proxima_tentativa', 'id'],
+                condition=models.Q(status='pendente'),
+                name='email_pendente_fila_idx',
+            ),
+            # E o purge_email_outbox só os finalizados, pelos mais antigos
+            models.Index(
+                fields=['criado_em'],
+                condition=~models.Q(status='pendente'),
+                name='email_finalizado_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.assunto} -> {', '.join(self.destinatarios)} ({self.status})"
+
+
+class Midia(models.Model):
+    """
+    Arquivo de foto no storage, com o número de registros (provas e perfis)
+    que apontam para ele. As fotos novas são gravadas pelo conteúdo (ver
+    api.midia), então bytes iguais viram um arquivo só.
+    """
+    nome = models.CharField(max_length=100, primary_key=True)
+    tamanho = models.BigIntegerField(null=True, blank=True)
+    referencias = models.PositiveIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.nome} ({self.referencias})"
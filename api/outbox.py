@@ -0,0 +1,135 @@
+"""
+Envio de emails transacionais por uma fila de saída (outbox) no banco.
+
+A requisição só grava um EmailPendente, na mesma transação do resto (ex.: o
+token de redefinição de senha), e responde na hora. O worker
+`manage.py process_email_outbox` lê os pendentes em lotes, envia cada lote
+por uma única conexão SMTP e, em caso de falha, agenda nova tentativa com
+backoff exponencial até MAX_TENTATIVAS.
+
+A mensagem pode conter segredos (ex.: o código de redefinição de senha), então
+o corpo é apagado assim que o email é enviado ou descartado; as linhas
+finalizadas são removidas por `manage.py purge_email_outbox`.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailPendente
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_TENTATIVAS = 8
+BACKOFF_INICIAL = 30
+BACKOFF_MAXIMO = 60 * 60
+# Tempo que um lote fica reservado para o worker que o pegou; se ele morrer
+# no meio do envio, outro worker retoma as mensagens depois disso
+RESERVA = 5 * 60
+
+
+def enfileirar_email(assunto, mensagem, destinatarios, remetente=None):
+    return EmailPendente.objects.create(
+        assunto=assunto,
+        mensagem=mensagem,
+        remetente=remetente or settings.DEFAULT_FROM_EMAIL,
+        destinatarios=list(destinatarios),
+    )
+
+
+def purgar(antes_de, batch_size=1000):
+    """
+    Remove, em lotes, os emails enviados ou descartados antes de `antes_de`.
+    Retorna quantos foram removidos.
+    """
+    finalizados = EmailPendente.objects.exclude(status=EmailPendente.PENDENTE).filter(
+        criado_em__lt=antes_de
+    )
+    total = 0
+    while True:
+        ids = list(finalizados.order_by("criado_em").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += EmailPendente.objects.filter(pk__in=ids).delete()[0]
+
+
+def backoff(tentativas):
+    """
+    Segundos até a próxima tentativa, com jitter para os workers não
+    tentarem todos ao mesmo tempo.
+    """
+    espera = min(BACKOFF_INICIAL * 2 ** (tentativas - 1), BACKOFF_MAXIMO)
+    return espera * random.uniform(0.8, 1.2)
+
+
+def _reservar_lote(limite):
+    agora = timezone.now()
+    with transaction.atomic():
+        lote = list(
+            EmailPendente.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailPendente.PENDENTE, proxima_tentativa__lte=agora)
+            .order_by("proxima_tentativa", "id")[:limite]
+        )
+        EmailPendente.objects.filter(pk__in=[email.pk for email in lote]).update(
+            proxima_tentativa=agora + timedelta(seconds=RESERVA)
+        )
+    return lote
+
+
+def _registrar_falha(email, erro):
+    email.tentativas += 1
+    email.ultimo_erro = str(erro) or erro.__class__.__name__
+    if email.tentativas >= MAX_TENTATIVAS:
+        email.status = EmailPendente.FALHOU
+        email.mensagem = ""
+        logger.error("Email %s descartado após %s tentativas: %s", email.pk, email.tentativas, erro)
+    else:
+        email.proxima_tentativa = timezone.now() + timedelta(seconds=backoff(email.tentativas))
+    email.save(update_fields=["tentativas", "ultimo_erro", "status", "proxima_tentativa", "mensagem"])
+
+
+def processar_lote(limite=BATCH_SIZE):
+    """
+    Envia até `limite` emails pendentes. Retorna (enviados, falhas).
+    """
+    lote = _reservar_lote(limite)
+    if not lote:
+        return 0, 0
+    enviados = falhas = 0
+    conexao = get_connection(fail_silently=False)
+    try:
+        conexao.open()
+    except Exception as exc:
+        # Servidor fora do ar: o lote inteiro volta para a fila
+        for email in lote:
+            _registrar_falha(email, exc)
+        return 0, len(lote)
+    try:
+        for email in lote:
+            mensagem = EmailMessage(
+                email.assunto,
+                email.mensagem,
+                email.remetente,
+                email.destinatarios,
+                connection=conexao,
+            )
+            try:
+                mensagem.send()
+            except Exception as exc:
+                _registrar_falha(email, exc)
+                falhas += 1
+                continue
+            email.status = EmailPendente.ENVIADO
+            email.tentativas += 1
+            email.enviado_em = timezone.now()
+            email.mensagem = ""
+            email.save(update_fields=["status", "tentativas", "enviado_em", "mensagem"])
+            enviados += 1
+    finally:
+        conexao.close()
+    return enviados, falhas
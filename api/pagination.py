@@ -0,0 +1,197 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils import timezone
+from drf_yasg import openapi
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) sobre um par de chaves estáveis (campo, id).
+
+    Cada página é obtida com um WHERE sobre a última posição vista, então o
+    custo não cresce com a profundidade da página (sem OFFSET). A paginação é
+    opcional: só é aplicada quando o cliente envia `cursor` ou `page_size`.
+    """
+
+    ordering = ("-id",)
+    page_size = api_settings.PAGE_SIZE or 10
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Cursor inválido."
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            campo[1:] if campo.startswith("-") else f"-{campo}"
+            for campo in self.ordering
+        )
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor["r"])
+        ordering = self.get_ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self.build_filter(ordering, cursor["p"]))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def build_filter(self, ordering, position):
+        # (campo, id) estritamente depois da posição, na direção da ordenação
+        campo, desempate = (c.lstrip("-") for c in ordering)
+        lookup = "lt" if ordering[0].startswith("-") else "gt"
+        valor, chave = position
+        return Q(**{f"{campo}__{lookup}": valor}) | Q(
+            **{campo: valor, f"{desempate}__{lookup}": chave}
+        )
+
+    def get_position(self, instance):
+        campo, desempate = (c.lstrip("-") for c in self.ordering)
+        valor = getattr(instance, campo)
+        if hasattr(valor, "isoformat"):
+            valor = valor.isoformat()
+        return [valor, getattr(instance, desempate)]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if not isinstance(cursor["p"], list) or len(cursor["p"]) != 2:
+                raise ValueError
+            return {"p": self.convert_position(cursor["p"]), "r": bool(cursor.get("r"))}
+        except (
+            binascii.Error, UnicodeError, ValueError, KeyError, TypeError,
+            DjangoValidationError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    def convert_position(self, position):
+        # O cursor vem do cliente: os dois valores são convertidos aqui, e não
+        # no WHERE, para um valor inválido virar 404 e não 500
+        convertidos = []
+        for campo, valor in zip(self.ordering, position):
+            field = self.model._meta.get_field(campo.lstrip("-"))
+            if valor is None or isinstance(valor, (list, dict, bool)):
+                raise ValueError(valor)
+            valor = field.to_python(valor)
+            if isinstance(valor, datetime.datetime) and timezone.is_naive(valor):
+                valor = timezone.make_aware(valor)
+            convertidos.append(valor)
+        return convertidos
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({"p": position, "r": int(reverse)}, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+
+class ConteudoPagination(KeysetPagination):
+    ordering = ("-data_criacao", "-id")
+
+
+class ProvaPagination(KeysetPagination):
+    ordering = ("data", "id")
+
+
+class AvaliacaoPagination(KeysetPagination):
+    ordering = ("-data_avaliacao", "-id")
+
+
+PAGINATION_PARAMETERS = [
+    openapi.Parameter(
+        "cursor",
+        openapi.IN_QUERY,
+        type=openapi.TYPE_STRING,
+        description="Cursor retornado em `next`/`previous` (ativa a paginação)",
+    ),
+    openapi.Parameter(
+        "page_size",
+        openapi.IN_QUERY,
+        type=openapi.TYPE_INTEGER,
+        description="Itens por página, máximo 100 (ativa a paginação)",
+    ),
+]
+
+
+def paginated_response(request, queryset, paginator_class, serializer_class, **kwargs):
+    """
+    Serializa a lista completa ou, se o cliente pedir, apenas uma página.
+    """
+    paginator = paginator_class()
+    if not paginator.is_requested(request):
+        queryset = queryset.order_by(*paginator.ordering)
+        return Response(serializer_class(queryset, many=True, **kwargs).data)
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(
+        serializer_class(page, many=True, **kwargs).data
+    )
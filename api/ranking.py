@@ -0,0 +1,219 @@
+"""
+Feed personalizado de conteúdos ("para mim").
+
+Os alunos são agrupados em segmentos pela série. Para cada segmento guardamos
+em RankingConteudo uma pontuação por conteúdo, baseada na nota média que
+alunos daquela série deram ao conteúdo, junto com o tipo do conteúdo.
+
+A pontuação é atualizada por conteúdo quando ele muda e por (conteúdo, série)
+quando uma avaliação muda. Na requisição lemos o topo do segmento, e o topo de
+cada tipo preferido pelo aluno (Vídeo/Áudio/Texto), por índice, e ajustamos
+pelas preferências e pelo histórico de avaliações do próprio aluno.
+"""
+import itertools
+import math
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Avg, Exists, OuterRef
+
+from .models import Avaliacao, Conteudo, PerfilUsuario, RankingConteudo
+
+TIPO_POR_PREFERENCIA = {
+    "pref_visual": "Vídeo",
+    "pref_auditivo": "Áudio",
+    "pref_leitura_escrita": "Texto",
+}
+SERIES = [serie for serie, _ in PerfilUsuario.SERIE_CHOICES] + [None]
+
+NOTA_MAXIMA = Avaliacao.NOTA_MAXIMA
+# Suavização bayesiana: conteúdos com poucas notas ficam perto da média neutra
+PESO_PRIOR = 3
+MEDIA_PRIOR = 0.5
+
+PESO_TIPO = 2.0
+PESO_SERIE = 1.0
+PESO_POPULARIDADE = 0.25
+PESO_TEMA = 1.0
+
+CANDIDATOS = 100
+FEED_LIMITE = 20
+FEED_LIMITE_MAXIMO = 100
+
+
+def segment_key(serie):
+    return serie or "-"
+
+
+def tipos_preferidos(perfil):
+    if perfil is None:
+        return set()
+    return {tipo for pref, tipo in TIPO_POR_PREFERENCIA.items() if getattr(perfil, pref)}
+
+
+def nota_normalizada(nota):
+    try:
+        valor = float(nota)
+    except (TypeError, ValueError):
+        return None
+    return min(max(valor / NOTA_MAXIMA, 0.0), 1.0)
+
+
+def score(notas):
+    """
+    Pontuação de um conteúdo num segmento, dadas as notas (já normalizadas)
+    de alunos daquela série.
+    """
+    media = (sum(notas) + MEDIA_PRIOR * PESO_PRIOR) / (len(notas) + PESO_PRIOR)
+    return PESO_SERIE * media + PESO_POPULARIDADE * math.log1p(len(notas))
+
+
+def _notas_por_serie(conteudo_ids):
+    notas = defaultdict(list)
+    avaliacoes = Avaliacao.objects.filter(conteudo_id__in=conteudo_ids).values_list(
+        "conteudo_id", "user__perfilusuario__serie_atual", "nota"
+    )
+    for conteudo_id, serie, nota in avaliacoes.iterator():
+        valor = nota_normalizada(nota)
+        if valor is not None:
+            notas[(conteudo_id, serie)].append(valor)
+    return notas
+
+
+def _rows_for(conteudo, notas, series=SERIES):
+    return [
+        RankingConteudo(
+            segmento=segment_key(serie),
+            conteudo=conteudo,
+            tipo=conteudo.tipo,
+            score=score(notas.get((conteudo.pk, serie), [])),
+        )
+        for serie in series
+    ]
+
+
+def _upsert(rows):
+    RankingConteudo.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["segmento", "conteudo"],
+        update_fields=["tipo", "score"],
+    )
+
+
+def refresh_conteudos(conteudos):
+    """
+    Recalcula os conteúdos em todos os segmentos; os inativos são removidos.
+    """
+    ativos = [c for c in conteudos if c.is_active]
+    inativos = [c.pk for c in conteudos if not c.is_active]
+    if inativos:
+        RankingConteudo.objects.filter(conteudo_id__in=inativos).delete()
+    notas = _notas_por_serie([c.pk for c in ativos])
+    _upsert([row for conteudo in ativos for row in _rows_for(conteudo, notas)])
+
+
+def add_new_conteudos(conteudo_ids):
+    """
+    Insere conteúdos recém-criados (ainda sem avaliações) em todos os
+    segmentos direto no banco, com INSERT ... SELECT. Usado na importação em
+    lote, onde montar um objeto por linha de ranking seria o gargalo.
+    """
+    if not conteudo_ids:
+        return
+    ranking_table = RankingConteudo._meta.db_table
+    conteudo_table = Conteudo._meta.db_table
+    placeholders = ", ".join(["%s"] * len(conteudo_ids))
+    with connection.cursor() as cursor:
+        for serie in SERIES:
+            cursor.execute(
+                f"INSERT INTO {ranking_table} (segmento, conteudo_id, tipo, score) "
+                f"SELECT %s, id, tipo, %s FROM {conteudo_table} "
+                f"WHERE is_active AND id IN ({placeholders})",
+                [segment_key(serie), score([]), *conteudo_ids],
+            )
+
+
+def refresh_conteudo(conteudo):
+    refresh_conteudos([conteudo])
+
+
+def refresh_conteudos_series(conteudo_ids, series):
+    """
+    Recalcula os conteúdos apenas nos segmentos das séries dadas: a de quem
+    os avaliou ou, quando o aluno troca de série, a antiga e a nova.
+    """
+    conteudos = Conteudo.objects.filter(pk__in=conteudo_ids, is_active=True)
+    notas = _notas_por_serie(conteudo_ids)
+    _upsert([row for conteudo in conteudos for row in _rows_for(conteudo, notas, series)])
+
+
+@transaction.atomic
+def rebuild(batch_size=500):
+    """
+    Reconstrói o ranking inteiro em lotes. Retorna o número de conteúdos.
+    """
+    RankingConteudo.objects.all().delete()
+    conteudos = Conteudo.objects.filter(is_active=True).order_by("pk").iterator(
+        chunk_size=batch_size
+    )
+    total = 0
+    while True:
+        lote = list(itertools.islice(conteudos, batch_size))
+        if not lote:
+            return total
+        notas = _notas_por_serie([c.pk for c in lote])
+        rows = [row for conteudo in lote for row in _rows_for(conteudo, notas)]
+        RankingConteudo.objects.bulk_create(rows, batch_size=batch_size)
+        total += len(lote)
+
+
+def _afinidade_por_tema(user):
+    """
+    Nota média normalizada que o aluno dá a cada tema. A média sai do banco,
+    uma linha por tema, sem trazer o histórico de avaliações do aluno.
+    """
+    medias = (
+        Avaliacao.objects.filter(user=user, nota__isnull=False)
+        .values("conteudo__tema")
+        .annotate(media=Avg("nota"))
+        .order_by()
+        .values_list("conteudo__tema", "media")
+    )
+    return {tema: nota_normalizada(media) for tema, media in medias}
+
+
+def feed_for(user, limite=FEED_LIMITE):
+    """
+    Conteúdos recomendados para o usuário, do mais para o menos relevante.
+    Conteúdos que ele já avaliou ficam de fora.
+    """
+    perfil = PerfilUsuario.objects.filter(user=user).first()
+    tipos = tipos_preferidos(perfil)
+    afinidade = _afinidade_por_tema(user)
+    # NOT EXISTS correlacionado: não carrega o histórico do aluno num NOT IN
+    avaliado = Avaliacao.objects.filter(user=user, conteudo=OuterRef("conteudo"))
+    segmento = (
+        RankingConteudo.objects.filter(
+            segmento=segment_key(perfil.serie_atual if perfil else None)
+        )
+        .filter(~Exists(avaliado))
+        .select_related("conteudo")
+        .order_by("-score")
+    )
+    quantidade = max(CANDIDATOS, limite)
+    # Uma consulta por tipo preferido, cada uma servida pelo índice do segmento
+    candidatos = {r.conteudo_id: r for r in segmento[:quantidade]}
+    for tipo in sorted(tipos):
+        for r in segmento.filter(tipo=tipo)[:quantidade]:
+            candidatos.setdefault(r.conteudo_id, r)
+
+    def pontuacao(r):
+        return (
+            r.score
+            + PESO_TIPO * (r.tipo in tipos)
+            + PESO_TEMA * (afinidade.get(r.conteudo.tema, MEDIA_PRIOR) - MEDIA_PRIOR)
+        )
+
+    ranqueados = sorted(candidatos.values(), key=pontuacao, reverse=True)
+    return [r.conteudo for r in ranqueados[:limite]]
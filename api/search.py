@@ -0,0 +1,126 @@
+"""
+Índice de busca textual dos conteúdos ativos (titulo e tema).
+
+No SQLite o índice é uma tabela virtual FTS5; no PostgreSQL é uma tabela com
+um tsvector e índice GIN. Os textos são normalizados aqui (minúsculas e sem
+acentos), então "matematica" encontra "Matemática" nos dois bancos sem
+depender de extensões como `unaccent`.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+
+SQLITE_TABLE = "api_conteudo_fts"
+POSTGRES_TABLE = "api_conteudo_busca"
+SEARCH_MAX_RESULTS = 50
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return re.findall(r"\w+", normalize(text))
+
+
+def index_conteudo(conteudo, conn=connection):
+    """
+    Insere ou atualiza o conteúdo no índice; inativos são removidos.
+    """
+    if not conteudo.is_active:
+        remove_conteudo(conteudo.pk, conn)
+        return
+    titulo, tema = normalize(conteudo.titulo), normalize(conteudo.tema)
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [conteudo.pk])
+            cursor.execute(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, titulo, tema) VALUES (%s, %s, %s)",
+                [conteudo.pk, titulo, tema],
+            )
+        elif conn.vendor == "postgresql":
+            cursor.execute(
+                f"INSERT INTO {POSTGRES_TABLE} (conteudo_id, documento) VALUES ("
+                " %s, setweight(to_tsvector('simple', %s), 'A')"
+                " || setweight(to_tsvector('simple', %s), 'B'))"
+                " ON CONFLICT (conteudo_id) DO UPDATE SET documento = EXCLUDED.documento",
+                [conteudo.pk, titulo, tema],
+            )
+
+
+def index_conteudos(conteudos, conn=connection):
+    """
+    Versão em lote de index_conteudo, para importações.
+    """
+    ativos = [c for c in conteudos if c.is_active]
+    inativos = [(c.pk,) for c in conteudos if not c.is_active]
+    linhas = [(c.pk, normalize(c.titulo), normalize(c.tema)) for c in ativos]
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            ids = [(c.pk,) for c in conteudos]
+            cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", ids)
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, titulo, tema) VALUES (%s, %s, %s)",
+                linhas,
+            )
+        elif conn.vendor == "postgresql":
+            cursor.executemany(
+                f"DELETE FROM {POSTGRES_TABLE} WHERE conteudo_id = %s", inativos
+            )
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (conteudo_id, documento) VALUES ("
+                " %s, setweight(to_tsvector('simple', %s), 'A')"
+                " || setweight(to_tsvector('simple', %s), 'B'))"
+                " ON CONFLICT (conteudo_id) DO UPDATE SET documento = EXCLUDED.documento",
+                linhas,
+            )
+
+
+def remove_conteudo(pk, conn=connection):
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [pk])
+        elif conn.vendor == "postgresql":
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE conteudo_id = %s", [pk])
+
+
+def search_ids(query, limit=SEARCH_MAX_RESULTS, conn=connection):
+    """
+    Ids dos conteúdos que casam com todos os termos (por prefixo), do mais
+    relevante para o menos relevante. Títulos pesam mais que temas.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            match = " ".join(f'"{token}"*' for token in tokens)
+            cursor.execute(
+                f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+                "ORDER BY rank LIMIT %s",
+                [match, limit],
+            )
+        elif conn.vendor == "postgresql":
+            match = " & ".join(f"{token}:*" for token in tokens)
+            cursor.execute(
+                f"SELECT conteudo_id FROM {POSTGRES_TABLE}, to_tsquery('simple', %s) q "
+                "WHERE documento @@ q ORDER BY ts_rank(documento, q) DESC LIMIT %s",
+                [match, limit],
+            )
+        else:
+            return _search_ids_fallback(tokens, limit)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_ids_fallback(tokens, limit):
+    # Outros bancos: sem índice textual, apenas filtro sem ranking
+    from django.db.models import Q
+
+    from .models import Conteudo
+
+    queryset = Conteudo.objects.filter(is_active=True)
+    for token in tokens:
+        queryset = queryset.filter(Q(titulo__icontains=token) | Q(tema__icontains=token))
+    return list(queryset.values_list("id", flat=True)[:limit])
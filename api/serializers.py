@@ -1,43 +1,136 @@
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Conteudo, Avaliacao, PerfilUsuario, Prova
+from .models import Conteudo, ConteudoEstatisticas, Avaliacao, PerfilUsuario, Prova, normalizar_email, usuarios_por_email
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
 import re
-from django.contrib.auth import authenticate
+from PIL import Image
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
+from .authentication import get_principal
+from .hashing import averificar_senha, gerar_hash
+from . import midia
+from .imagens import agendar_miniaturas, urls_miniaturas
+from .armazenamento import ler_inicio
+from .uploads import TIPOS, ArquivoGrandeDemais, FormatoNaoSuportado, detectar_formato, ler_envio
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+class FotoField(serializers.ImageField):
+    """
+    ImageField que, para fotos recebidas pelo FotoMultiPartParser (tamanho e
+    assinatura já conferidos), só lê o cabeçalho da imagem em vez de
+    decodificá-la inteira.
+    """
+
+    def to_internal_value(self, data):
+        if getattr(data, 'formato', None) is None:
+            return super().to_internal_value(data)
+        arquivo = serializers.FileField.to_internal_value(self, data)
+        try:
+            # Image.open só lê o cabeçalho; os pixels ficam para as miniaturas
+            with Image.open(arquivo) as imagem:
+                if imagem.format != arquivo.formato:
+                    raise ValueError(imagem.format)
+        except Exception:
+            self.fail('invalid_image')
+        finally:
+            arquivo.seek(0)
+        return arquivo
+
 class UserSerializer(serializers.ModelSerializer):
     pref_visual = serializers.BooleanField(source='perfilusuario.pref_visual', read_only=True)
     pref_auditivo = serializers.BooleanField(source='perfilusuario.pref_auditivo', read_only=True)
     pref_leitura_escrita = serializers.BooleanField(source='perfilusuario.pref_leitura_escrita', read_only=True)
     serie_atual = serializers.CharField(source='perfilusuario.serie_atual', read_only=True)
     foto_perfil = serializers.ImageField(source='perfilusuario.fotoPerfil')
+    foto_perfil_miniaturas = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'is_staff', 'pref_visual', 'pref_auditivo', 'pref_leitura_escrita', 'serie_atual', 'foto_perfil']
+        fields = ['id', 'username', 'email', 'is_staff', 'pref_visual', 'pref_auditivo', 'pref_leitura_escrita', 'serie_atual', 'foto_perfil', 'foto_perfil_miniaturas']
         read_only_fields = ['is_staff']  # Apenas admin pode alterar
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Os campos do perfil vêm do mesmo JOIN, sem uma consulta por usuário
+        return queryset.select_related('perfilusuario')
+
+    def get_foto_perfil_miniaturas(self, obj):
+        perfil = getattr(obj, 'perfilusuario', None)
+        return urls_miniaturas(perfil and perfil.fotoPerfil, self.context.get('request'))
+
 class LoginSerializer(serializers.Serializer):
+    """
+    Só os campos; a conferência da senha é assíncrona (`autenticar_login`).
+    """
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
 
-    def validate(self, data):
-        email = data.get('email')
-        password = data.get('password')
-        if not email or not password:
-            raise serializers.ValidationError("Email e senha obrigatórios.")
-        user = User.objects.filter(email=email).first()
-        if not user:
-            raise serializers.ValidationError("Email ou senha incorretos.")
-        if not user.is_active:
-            raise serializers.ValidationError("Conta desativada.")
-        authenticated_user = authenticate(username=user.username,password=password)
-        if not authenticated_user:
-            raise serializers.ValidationError("Email ou senha incorretos.")
-        refresh = RefreshToken.for_user(authenticated_user)
-        return {
-            'access': str(refresh.access_token),
-            'refresh': str(refresh),
-        }
+
+async def autenticar_login(email, password):
+    """
+    Access e refresh para email e senha. Levanta ValidationError com
+    credenciais inválidas e ServicoSobrecarregado (503) com a fila de hash cheia.
+    """
+    user = await usuarios_por_email(email).afirst()
+    if not user:
+        raise serializers.ValidationError("Email ou senha incorretos.")
+    if not user.is_active:
+        raise serializers.ValidationError("Conta desativada.")
+    # O PBKDF2 roda no executor limitado, sem prender a thread do worker
+    if not await averificar_senha(user, password):
+        raise serializers.ValidationError("Email ou senha incorretos.")
+    refresh = await sync_to_async(RefreshToken.for_user)(user)
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+    }
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Renova o access token sem senha. O refresh usado vai para a blacklist
+    (rotação) e um novo é devolvido; contas desativadas não renovam.
+    """
+
+    def validate(self, attrs):
+        # Assinatura, expiração e blacklist (busca pelo jti, que é indexado)
+        refresh = self.token_class(attrs['refresh'])
+        user = get_principal(refresh.get(jwt_settings.USER_ID_CLAIM))
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("Conta desativada.", code='user_inactive')
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                # blacklist() do simplejwt usa get_or_create e aceitaria duas
+                # renovações simultâneas; o create direto esbarra na unicidade
+                # de BlacklistedToken.token e só uma delas passa.
+                try:
+                    with transaction.atomic():
+                        outstanding, _ = OutstandingToken.objects.get_or_create(
+                            jti=refresh[jwt_settings.JTI_CLAIM],
+                            defaults={
+                                'user': user,
+                                'token': str(refresh),
+                                'expires_at': datetime_from_epoch(refresh['exp']),
+                            },
+                        )
+                        BlacklistedToken.objects.create(token=outstanding)
+                except IntegrityError:
+                    # Outra requisição já renovou com este mesmo refresh
+                    raise InvalidToken("Token já utilizado.")
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
 
 class UserCreateSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(
@@ -63,11 +156,11 @@ class UserCreateSerializer(serializers.ModelSerializer):
         fields = ['username', 'email', 'password']
 
     def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
+        if usuarios_por_email(value).exists():
             raise serializers.ValidationError("Este email já está cadastrado.")
         if '@' not in value or '.' not in value.split('@')[-1]:
             raise serializers.ValidationError("Insira um email válido, como exemplo@dominio.com")
-        return value
+        return normalizar_email(value)
 
     def validate_password(self, value):
         if not re.search(r'[A-Z]', value):
@@ -79,21 +172,47 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-
-        # Cria o usuário
-        user = User.objects.create_user(
-            username=validated_data['username'],
+        # Um único hash da senha (no executor limitado) e um INSERT por tabela
+        user = User(
+            username=User.normalize_username(validated_data['username']),
             email=validated_data['email'],
-            password=validated_data['password'],
+            password=gerar_hash(validated_data['password']),
         )
-        user.set_password(validated_data['password'])
-        user.save()
-
-        # Cria o perfil do usuário
-        PerfilUsuario.objects.create(user=user)
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+                # Cria o perfil do usuário
+                PerfilUsuario.objects.create(user=user)
+        except IntegrityError:
+            # Cadastro concorrente com o mesmo email ou username
+            if usuarios_por_email(user.email).exists():
+                raise serializers.ValidationError({'email': ["Este email já está cadastrado."]})
+            raise serializers.ValidationError({'username': ["Este nome de usuário já está em uso."]})
 
         return user
 
+class MatriculaAlunoSerializer(UserCreateSerializer):
+    """
+    Uma linha da lista de alunos da matrícula em lote. Mesmas regras do
+    cadastro, mas a unicidade de username e email é conferida para o lote
+    inteiro de uma vez (ver api.matricula), não com uma consulta por linha.
+    """
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    serie_atual = serializers.ChoiceField(
+        choices=PerfilUsuario.SERIE_CHOICES, required=False, allow_null=True
+    )
+
+    class Meta(UserCreateSerializer.Meta):
+        fields = ['username', 'email', 'password', 'serie_atual']
+
+    def validate_username(self, value):
+        return User.normalize_username(value)
+
+    def validate_email(self, value):
+        if '@' not in value or '.' not in value.split('@')[-1]:
+            raise serializers.ValidationError("Insira um email válido, como exemplo@dominio.com")
+        return normalizar_email(value)
+
 class PerfilUsuarioSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
@@ -101,6 +220,10 @@ class PerfilUsuarioSerializer(serializers.ModelSerializer):
         model = PerfilUsuario
         fields = ['user', 'pref_visual', 'pref_auditivo', 'pref_leitura_escrita']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('user')
+
     def create(self, validated_data):
         # Vincula ao usuário logado
         validated_data['user'] = self.context['request'].user
@@ -114,8 +237,17 @@ class PerfilUsuarioUpdateSerializer(serializers.ModelSerializer):
 class ConteudoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conteudo
-        fields = ['id', 'titulo', 'tipo', 'tema', 'url', 'duracao_estimada', 'data_criacao']
-        read_only_fields = ['data_criacao']
+        fields = ['id', 'titulo', 'tipo', 'tema', 'url', 'duracao_estimada', 'data_criacao', 'atualizado_em']
+        read_only_fields = ['data_criacao', 'atualizado_em']
+
+class ConteudoEstatisticasSerializer(serializers.ModelSerializer):
+    media = serializers.FloatField(read_only=True)
+    histograma = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = ConteudoEstatisticas
+        fields = ['conteudo', 'total_avaliacoes', 'total_notas', 'media', 'histograma']
+        read_only_fields = fields
 
 class AvaliacaoSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -126,13 +258,37 @@ class AvaliacaoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Avaliacao
-        fields = ['id', 'user', 'conteudo', 'conteudo_id', 'nota', 'comentario', 'data_avaliacao']
-        read_only_fields = ['user', 'data_avaliacao']
+        fields = ['id', 'user', 'conteudo', 'conteudo_id', 'nota', 'comentario', 'data_avaliacao', 'atualizado_em']
+        read_only_fields = ['user', 'data_avaliacao', 'atualizado_em']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Tudo o que é aninhado na resposta (conteúdo, usuário e perfil do usuário)
+        return queryset.select_related('conteudo', 'user__perfilusuario')
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
     
+class AvaliacaoLoteItemSerializer(serializers.ModelSerializer):
+    # Validado em lote na view, com uma única consulta para todos os itens
+    conteudo_id = serializers.IntegerField()
+
+    class Meta:
+        model = Avaliacao
+        fields = ['conteudo_id', 'nota', 'comentario']
+
+class AvaliacaoLoteSerializer(serializers.Serializer):
+    avaliacoes = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=100,
+        error_messages={
+            'min_length': 'Envie pelo menos uma avaliação.',
+            'max_length': 'Envie no máximo 100 avaliações por vez.',
+        }
+    )
+
 class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField(
         required=True,
@@ -144,9 +300,9 @@ class PasswordResetRequestSerializer(serializers.Serializer):
     )
 
     def validate_email(self, value):
-        if not User.objects.filter(email=value).exists():
+        if not usuarios_por_email(value).exists():
             raise serializers.ValidationError("Email não encontrado.")
-        return value
+        return normalizar_email(value)
     
 class PasswordResetConfirmSerializer(serializers.Serializer):
     new_password = serializers.CharField(
@@ -218,7 +374,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
     pref_visual = serializers.BooleanField(required=False)
     pref_auditivo = serializers.BooleanField(required=False)
     pref_leitura_escrita = serializers.BooleanField(required=False)
-    foto_perfil = serializers.ImageField(
+    foto_perfil = FotoField(
         source='perfilusuario.fotoPerfil',
         required=False,
         allow_null=True,
@@ -241,17 +397,18 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         }
 
     def validate_email(self, value):
-        if User.objects.filter(email=value).exclude(pk=self.instance.pk).exists():
+        if usuarios_por_email(value).exclude(pk=self.instance.pk).exists():
             raise serializers.ValidationError("Este email já está cadastrado.")
         if '@' not in value or '.' not in value.split('@')[-1]:
             raise serializers.ValidationError("Insira um email válido, como exemplo@dominio.com")
-        return value
+        return normalizar_email(value)
 
     def validate_username(self, value):
         if User.objects.filter(username=value).exclude(pk=self.instance.pk).exists():
             raise serializers.ValidationError("Este nome de usuário já está em uso.")
         return value
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # Extrai dados do perfil se existirem
         perfil_data = validated_data.pop('perfilusuario', {})
@@ -261,30 +418,159 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
         # Atualiza o perfil se houver dados
         if perfil_data:
+            if perfil_data.get('fotoPerfil'):
+                perfil_data['fotoPerfil'] = midia.guardar(perfil_data['fotoPerfil'])
             try:
                 perfil = user.perfilusuario
-                # Se for enviada uma nova foto, exclui a antiga
-                if 'fotoPerfil' in perfil_data and perfil.fotoPerfil:
-                    nova_foto = perfil_data.get('fotoPerfil')
-                    if nova_foto and hasattr(perfil.fotoPerfil, 'path') and perfil.fotoPerfil.path != nova_foto:
-                        perfil.fotoPerfil.delete(save=False)
+                # Se for enviada uma nova foto, libera a antiga
+                if perfil_data.get('fotoPerfil'):
+                    midia.liberar(perfil.fotoPerfil.name)
                 for key, value in perfil_data.items():
                     if value is not None:
                         setattr(perfil, key, value)
                 perfil.save()
             except PerfilUsuario.DoesNotExist:
                 # Se o perfil não existe, cria um novo
-                PerfilUsuario.objects.create(user=user, **perfil_data)
+                perfil = PerfilUsuario.objects.create(user=user, **perfil_data)
+            if perfil_data.get('fotoPerfil'):
+                agendar_miniaturas(perfil.fotoPerfil)
 
         return user
 
 class ProvaSerializer(serializers.ModelSerializer):
+    foto = FotoField(required=False, allow_null=True)
+    foto_miniaturas = serializers.SerializerMethodField()
+
     class Meta:
         model = Prova
-        fields = ['id','titulo', 'data', 'foto', 'descricao', 'criado_em']
-        read_only_fields = ['criado_em']
+        fields = ['id','titulo', 'data', 'foto', 'foto_miniaturas', 'descricao', 'criado_em', 'atualizado_em']
+        read_only_fields = ['criado_em', 'atualizado_em']
+
+    def get_foto_miniaturas(self, obj):
+        return urls_miniaturas(obj.foto, self.context.get('request'))
 
+    @transaction.atomic
     def create(self, validated_data):
         validated_data['usuario'] = self.context['request'].user
-        return super().create(validated_data)
+        if validated_data.get('foto'):
+            validated_data['foto'] = midia.guardar(validated_data['foto'])
+        prova = super().create(validated_data)
+        agendar_miniaturas(prova.foto)
+        return prova
 
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        foto_anterior = instance.foto.name
+        if validated_data.get('foto'):
+            validated_data['foto'] = midia.guardar(validated_data['foto'])
+        prova = super().update(instance, validated_data)
+        if 'foto' in validated_data:
+            midia.liberar(foto_anterior)
+            agendar_miniaturas(prova.foto)
+        return prova
+
+class ProvaFiltroSerializer(serializers.Serializer):
+    """
+    Filtros por data da listagem e do calendário de provas (query string):
+    `from` e `to` (inclusivos) e `upcoming` (true: de hoje em diante; false:
+    só as passadas). Todos viram um intervalo sobre o índice (usuario, data).
+    """
+
+    def get_fields(self):
+        # `from` é palavra reservada, então os campos não são atributos da classe
+        return {
+            'from': serializers.DateField(required=False),
+            'to': serializers.DateField(required=False),
+            'upcoming': serializers.BooleanField(required=False, allow_null=True),
+        }
+
+    def validate(self, data):
+        if data.get('from') and data.get('to') and data['from'] > data['to']:
+            raise serializers.ValidationError({'to': ["Deve ser igual ou posterior a 'from'."]})
+        return data
+
+    def filtrar(self, queryset):
+        filtros = self.validated_data
+        if filtros.get('from'):
+            queryset = queryset.filter(data__gte=filtros['from'])
+        if filtros.get('to'):
+            queryset = queryset.filter(data__lte=filtros['to'])
+        if filtros.get('upcoming') is not None:
+            hoje = timezone.localdate()
+            if filtros['upcoming']:
+                queryset = queryset.filter(data__gte=hoje)
+            else:
+                queryset = queryset.filter(data__lt=hoje)
+        return queryset
+
+class CalendarioFiltroSerializer(ProvaFiltroSerializer):
+    def get_fields(self):
+        return {
+            **super().get_fields(),
+            'por': serializers.ChoiceField(choices=['dia', 'mes'], default='dia'),
+        }
+
+class UploadDiretoSerializer(serializers.Serializer):
+    campo = serializers.ChoiceField(choices=['foto', 'foto_perfil'])
+    sha256 = serializers.RegexField(r'^[0-9a-f]{64}$')
+    tamanho = serializers.IntegerField(min_value=1)
+    tipo = serializers.CharField()
+
+    def validate(self, data):
+        # Mesmos limites e formatos do upload multipart, antes de enviar um byte
+        limite = settings.UPLOAD_LIMITES[data['campo']]
+        if data['tamanho'] > limite:
+            raise ArquivoGrandeDemais(
+                f"O arquivo de '{data['campo']}' passa do limite de {limite // (1024 * 1024)} MB."
+            )
+        if data['tipo'] not in TIPOS:
+            raise FormatoNaoSuportado()
+        return data
+
+class ConfirmarUploadSerializer(serializers.Serializer):
+    """
+    Anexa à prova (campo `foto`) ou ao perfil (`foto_perfil`) o arquivo
+    enviado direto ao storage com a URL de `UploadDiretoSerializer`.
+    """
+    token = serializers.CharField()
+    prova = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        user = self.context['request'].user
+        envio = ler_envio(data['token'], user)
+        if envio is None:
+            raise serializers.ValidationError({'token': ["Envio inválido ou expirado."]})
+        if envio['campo'] == 'foto':
+            if 'prova' not in data:
+                raise serializers.ValidationError({'prova': ["Informe a prova da foto."]})
+            try:
+                data['prova'] = Prova.objects.get(pk=data['prova'], usuario=user)
+            except Prova.DoesNotExist:
+                raise serializers.ValidationError({'prova': ["Prova não encontrada."]})
+        try:
+            tamanho = default_storage.size(envio['chave'])
+        except FileNotFoundError:
+            raise serializers.ValidationError({'token': ["O arquivo ainda não foi enviado."]})
+        if tamanho != envio['tamanho']:
+            raise serializers.ValidationError({'token': ["O arquivo enviado está incompleto."]})
+        if detectar_formato(ler_inicio(default_storage, envio['chave'])) != envio['formato']:
+            raise FormatoNaoSuportado()
+        data['envio'] = envio
+        return data
+
+    @transaction.atomic
+    def create(self, validated_data):
+        envio = validated_data['envio']
+        nome = midia.guardar_enviado(envio['chave'], envio['nome'])
+        if envio['campo'] == 'foto':
+            instancia = validated_data['prova']
+            campo = 'foto'
+        else:
+            instancia = PerfilUsuario.objects.get_or_create(user=self.context['request'].user)[0]
+            campo = 'fotoPerfil'
+        anterior = getattr(instancia, campo).name
+        setattr(instancia, campo, nome)
+        instancia.save()
+        midia.liberar(anterior)
+        agendar_miniaturas(getattr(instancia, campo))
+        return instancia
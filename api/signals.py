@@ -0,0 +1,137 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import midia, ranking, search
+from .authentication import invalidate_principal
+from .cache import bump_catalog_version
+from .models import Avaliacao, Conteudo, ConteudoEstatisticas, PerfilUsuario, Prova
+
+
+@receiver(post_save, sender=Conteudo)
+@receiver(post_delete, sender=Conteudo)
+def invalidate_catalog(sender, instance, **kwargs):
+    # Só invalida depois do commit, para nenhum worker recarregar o cache
+    # com dados ainda não confirmados no banco.
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Conteudo)
+def index_conteudo(sender, instance, **kwargs):
+    search.index_conteudo(instance)
+
+
+@receiver(post_delete, sender=Conteudo)
+def unindex_conteudo(sender, instance, **kwargs):
+    search.remove_conteudo(instance.pk)
+
+
+@receiver(post_save, sender=Conteudo)
+def rank_conteudo(sender, instance, **kwargs):
+    transaction.on_commit(lambda: ranking.refresh_conteudo(instance), robust=True)
+
+
+def refresh_avaliacoes_ranking(user, conteudo_ids, series=None):
+    """
+    Agenda a atualização do ranking dos conteúdos avaliados por `user`, no
+    segmento da série atual dele ou nas `series` dadas. Também usado pela
+    criação em lote, que não dispara sinais.
+    """
+    if series is None:
+        series = [
+            PerfilUsuario.objects.filter(user=user)
+            .values_list("serie_atual", flat=True)
+            .first()
+        ]
+
+    # Depois do commit, porque num delete em cascata o conteúdo pode estar
+    # sumindo; robust, porque uma falha no ranking (dado derivado) não pode
+    # parecer uma falha da avaliação, que já foi gravada
+    transaction.on_commit(
+        lambda: ranking.refresh_conteudos_series(list(conteudo_ids), series),
+        robust=True,
+    )
+
+
+@receiver(post_save, sender=Avaliacao)
+@receiver(post_delete, sender=Avaliacao)
+def rerank_avaliacao(sender, instance, **kwargs):
+    refresh_avaliacoes_ranking(instance.user_id, [instance.conteudo_id])
+
+
+@receiver(pre_save, sender=PerfilUsuario)
+def carregar_serie_salva(sender, instance, **kwargs):
+    instance._serie_salva = (
+        PerfilUsuario.objects.filter(pk=instance.pk)
+        .values_list("serie_atual", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=PerfilUsuario)
+def rerank_troca_de_serie(sender, instance, created, **kwargs):
+    # As notas do aluno saem do segmento da série antiga e entram no da nova
+    # (sem perfil, o aluno contava no segmento sem série)
+    antiga = instance._serie_salva
+    if antiga == instance.serie_atual:
+        return
+    conteudo_ids = list(
+        Avaliacao.objects.filter(user_id=instance.user_id).values_list("conteudo_id", flat=True)
+    )
+    if conteudo_ids:
+        refresh_avaliacoes_ranking(
+            instance.user_id, conteudo_ids, series=[antiga, instance.serie_atual]
+        )
+
+
+@receiver(post_save, sender=Avaliacao)
+def atualizar_estatisticas(sender, instance, created, **kwargs):
+    # _estado_salvo foi lido do banco, com a linha travada, em Avaliacao.save
+    novo = instance._estado_atual()
+    antigo = None if created else instance._estado_salvo
+    if antigo != novo:
+        if antigo is not None:
+            ConteudoEstatisticas.aplicar(*antigo, sinal=-1)
+        ConteudoEstatisticas.aplicar(*novo, sinal=1)
+
+
+@receiver(pre_delete, sender=Avaliacao)
+def carregar_estado_avaliacao(sender, instance, **kwargs):
+    # Dentro da transação do delete (também em cascata): o que sai dos
+    # agregados é o que está no banco, não o que a instância carregou
+    instance._estado_salvo = instance._estado_no_banco()
+
+
+@receiver(post_delete, sender=Avaliacao)
+def remover_das_estatisticas(sender, instance, **kwargs):
+    # None: outra transação já apagou a linha e descontou a avaliação
+    if instance._estado_salvo is not None:
+        ConteudoEstatisticas.aplicar(*instance._estado_salvo, sinal=-1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_principal_usuario(sender, instance, **kwargs):
+    # Perfil atualizado, conta desativada, senha redefinida: a próxima
+    # requisição autenticada recarrega o usuário do banco
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_principal(user_id))
+
+
+@receiver(post_save, sender=PerfilUsuario)
+@receiver(post_delete, sender=PerfilUsuario)
+def invalidar_principal_perfil(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_principal(user_id))
+
+
+@receiver(post_delete, sender=Prova)
+def liberar_foto_prova(sender, instance, **kwargs):
+    # Também nas exclusões em massa e em cascata (ex.: conta apagada)
+    midia.liberar(instance.foto.name)
+
+
+@receiver(post_delete, sender=PerfilUsuario)
+def liberar_foto_perfil(sender, instance, **kwargs):
+    midia.liberar(instance.fotoPerfil.name)
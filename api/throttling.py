@@ -0,0 +1,223 @@
+"""
+Limite de taxa e de concorrência para os endpoints públicos de autenticação.
+
+Login, cadastro e redefinição de senha são AllowAny e cada chamada pode custar
+um hash de senha, um email ou várias consultas. Dois mecanismos barram o abuso
+antes de qualquer acesso ao banco ou criptografia:
+
+- AuthRateThrottle: token bucket por IP e por email (o email vem do corpo da
+  requisição), com as taxas de AUTH_THROTTLE_RATES. Os buckets ficam na memória
+  do processo, divididos em shards com um lock cada, ou num cache do Django
+  compartilhado entre os workers (AUTH_THROTTLE_CACHE).
+- limitar_concorrencia: teto de requisições simultâneas por classe de endpoint
+  (AUTH_CONCURRENCY); acima dele a requisição recebe 503 na hora.
+"""
+import contextlib
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+from .models import normalizar_email
+
+SHARDS = 16
+# Acima disso um shard descarta os buckets parados (que já estão cheios)
+MAX_BUCKETS_POR_SHARD = 10_000
+
+_PERIODOS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """
+    "10/min" -> (10, 60): capacidade do bucket e período em segundos.
+    """
+    quantidade, periodo = rate.split("/")
+    return int(quantidade), _PERIODOS[periodo[0]]
+
+
+class TokenBuckets:
+    """
+    Buckets em memória, divididos em shards para que requisições de clientes
+    diferentes raramente disputem o mesmo lock.
+    """
+
+    def __init__(self, shards=SHARDS):
+        self.shards = [(threading.Lock(), {}) for _ in range(shards)]
+
+    def consumir(self, chave, capacidade, periodo):
+        """
+        Tira uma ficha do bucket `chave`. Retorna 0 se havia ficha, senão os
+        segundos até a próxima.
+        """
+        lock, buckets = self.shards[hash(chave) % len(self.shards)]
+        agora = time.monotonic()
+        with lock:
+            fichas, ultimo = buckets.get(chave, (capacidade, agora))
+            fichas, espera = _recarregar(fichas, ultimo, agora, capacidade, periodo)
+            buckets[chave] = (fichas, agora)
+            if len(buckets) > MAX_BUCKETS_POR_SHARD:
+                _descartar_parados(buckets, agora - periodo)
+        return espera
+
+    def limpar(self):
+        for lock, buckets in self.shards:
+            with lock:
+                buckets.clear()
+
+
+class CacheTokenBuckets:
+    """
+    Buckets num cache do Django, compartilhados entre processos. Ler e gravar
+    não é atômico: sob disputa o limite é aproximado.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consumir(self, chave, capacidade, periodo):
+        chave = f"throttle:{chave}"
+        agora = time.time()
+        fichas, ultimo = self.cache.get(chave, (capacidade, agora))
+        fichas, espera = _recarregar(fichas, ultimo, agora, capacidade, periodo)
+        self.cache.set(chave, (fichas, agora), timeout=periodo)
+        return espera
+
+    def limpar(self):
+        pass
+
+
+def _recarregar(fichas, ultimo, agora, capacidade, periodo):
+    por_segundo = capacidade / periodo
+    fichas = min(capacidade, fichas + (agora - ultimo) * por_segundo)
+    if fichas >= 1:
+        return fichas - 1, 0
+    return fichas, (1 - fichas) / por_segundo
+
+
+def _descartar_parados(buckets, limite):
+    for chave in [chave for chave, (_, ultimo) in buckets.items() if ultimo < limite]:
+        del buckets[chave]
+
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        with _buckets_lock:
+            if _buckets is None:
+                alias = getattr(settings, "AUTH_THROTTLE_CACHE", None)
+                _buckets = CacheTokenBuckets(alias) if alias else TokenBuckets()
+    return _buckets
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    Throttle por IP e por email para uma classe de endpoint (`scope`). As taxas
+    vêm de AUTH_THROTTLE_RATES[scope], ex.: {"ip": "60/min", "email": "10/min"}.
+    """
+
+    scope = None
+
+    def allow_request(self, request, view):
+        rates = settings.AUTH_THROTTLE_RATES.get(self.scope, {})
+        identidades = {"ip": self.get_ident(request), "email": _email(request)}
+        self.espera = 0
+        for tipo, rate in rates.items():
+            if not identidades.get(tipo):
+                continue
+            capacidade, periodo = parse_rate(rate)
+            chave = f"{self.scope}:{tipo}:{identidades[tipo]}"
+            self.espera = max(
+                self.espera, get_buckets().consumir(chave, capacidade, periodo)
+            )
+        return self.espera == 0
+
+    def wait(self):
+        return self.espera
+
+
+def _email(request):
+    try:
+        email = request.data.get("email")
+    except AttributeError:
+        return None
+    return normalizar_email(email) if isinstance(email, str) else None
+
+
+class LoginThrottle(AuthRateThrottle):
+    scope = "login"
+
+
+class CadastroThrottle(AuthRateThrottle):
+    scope = "cadastro"
+
+
+class PasswordResetThrottle(AuthRateThrottle):
+    scope = "password_reset"
+
+
+class ServicoSobrecarregado(APIException):
+    """
+    503 do controle de carga: teto de concorrência daqui e fila de hash de
+    senha cheia (api.hashing).
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Servidor ocupado. Tente novamente em instantes."
+    default_code = "servico_sobrecarregado"
+
+    def __init__(self, detail=None, code=None, wait=1):
+        super().__init__(detail, code)
+        # Vira o cabeçalho Retry-After na resposta do DRF
+        self.wait = wait
+
+
+_vagas = {}
+_vagas_lock = threading.Lock()
+
+
+def _vagas_para(classe):
+    if classe not in _vagas:
+        with _vagas_lock:
+            if classe not in _vagas:
+                _vagas[classe] = threading.BoundedSemaphore(settings.AUTH_CONCURRENCY[classe])
+    return _vagas[classe]
+
+
+@contextlib.contextmanager
+def ocupar_vaga(classe):
+    """
+    Ocupa uma das AUTH_CONCURRENCY[classe] vagas enquanto o bloco roda;
+    sem vaga, ServicoSobrecarregado na hora.
+    """
+    vagas = _vagas_para(classe)
+    if not vagas.acquire(blocking=False):
+        raise ServicoSobrecarregado()
+    try:
+        yield
+    finally:
+        vagas.release()
+
+
+def limitar_concorrencia(classe):
+    """
+    Limita a AUTH_CONCURRENCY[classe] as execuções simultâneas da view. Vai
+    abaixo do @api_view, para rodar depois dos throttles.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with ocupar_vaga(classe):
+                return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
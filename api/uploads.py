@@ -0,0 +1,247 @@
+"""
+Recebimento das fotos enviadas por multipart (perfil e provas).
+
+Com os handlers padrão do Django a foto ficava em memória (até 2,5 MB) ou num
+arquivo temporário fora do MEDIA_ROOT, era decodificada inteira na validação
+do serializer e depois copiada para o MEDIA_ROOT. Aqui:
+
+- o tamanho total (Content-Length) e o de cada campo são limitados por
+  UPLOAD_LIMITES, e o formato é conferido pela assinatura dos primeiros bytes;
+  uploads fora do limite são recusados durante o envio (413/415);
+- os bytes vão em blocos direto para um arquivo em MEDIA_ROOT/.uploads, com o
+  SHA-256 calculado no caminho, então a memória por upload é constante;
+- como o arquivo já está no mesmo disco, gravá-lo no campo da foto é um
+  rename, sem segunda cópia.
+
+Para fotos grandes há também o envio direto ao storage (ver
+api.armazenamento): `autorizar_envio` gera a URL de upload para uma chave
+temporária em PASTA_ENVIOS e um token com o que foi declarado (campo, tamanho,
+SHA-256, formato); o cliente envia os bytes e confirma com o token.
+"""
+import datetime
+import hashlib
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParser as DjangoMultiPartParser
+from django.http.multipartparser import MultiPartParserError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+from .armazenamento import validade_upload
+from .midia import EXTENSOES, PASTA
+
+# Formato -> assinaturas possíveis no início do arquivo
+ASSINATURAS = {
+    "JPEG": [b"\xff\xd8\xff"],
+    "PNG": [b"\x89PNG\r\n\x1a\n"],
+    "GIF": [b"GIF87a", b"GIF89a"],
+    "WEBP": [b"RIFF"],
+}
+# Content-Type declarado no envio direto -> formato
+TIPOS = {
+    "image/jpeg": "JPEG",
+    "image/png": "PNG",
+    "image/gif": "GIF",
+    "image/webp": "WEBP",
+}
+# Folga para os campos de texto que vêm junto com a foto
+FOLGA_CAMPOS = 64 * 1024
+# Chaves temporárias dos envios diretos; as não confirmadas ficam órfãs e são
+# apagadas pelo `manage.py purge_media`
+PASTA_ENVIOS = "images/envios"
+SALT_ENVIO = "api.uploads.envio"
+
+
+class ArquivoGrandeDemais(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Arquivo grande demais."
+    default_code = "arquivo_grande_demais"
+
+
+class FormatoNaoSuportado(APIException):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_detail = "Formato de imagem inválido. Use JPG, PNG, GIF ou WebP."
+    default_code = "formato_nao_suportado"
+
+
+def detectar_formato(inicio):
+    for formato, assinaturas in ASSINATURAS.items():
+        if any(inicio.startswith(assinatura) for assinatura in assinaturas):
+            if formato == "WEBP" and inicio[8:12] != b"WEBP":
+                continue
+            return formato
+    return None
+
+
+class ArquivoRecebido(TemporaryUploadedFile):
+    """
+    Upload gravado em `pasta` (no mesmo disco do destino), com o SHA-256 e o
+    formato detectado.
+    """
+
+    def __init__(self, name, content_type, charset, content_type_extra, pasta):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix=".upload" + ext, dir=pasta)
+        UploadedFile.__init__(self, file, name, content_type, 0, charset, content_type_extra)
+        self.sha256 = None
+        self.formato = None
+
+
+class ArquivoUploadHandler(FileUploadHandler):
+    """
+    Grava cada foto direto em MEDIA_ROOT/.uploads, em blocos, conferindo
+    tamanho e formato enquanto os bytes chegam.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, request=None, limites=None):
+        super().__init__(request)
+        self.limites = settings.UPLOAD_LIMITES if limites is None else limites
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Recusa antes de ler o corpo quando o total já passa do permitido
+        if content_length and content_length > sum(self.limites.values()) + FOLGA_CAMPOS:
+            raise ArquivoGrandeDemais()
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name not in self.limites:
+            raise ParseError(f"Campo de arquivo inesperado: {field_name}.")
+        self.limite = self.limites[field_name]
+        self.hash = hashlib.sha256()
+        pasta = os.path.join(settings.MEDIA_ROOT, ".uploads")
+        os.makedirs(pasta, exist_ok=True)
+        self.file = ArquivoRecebido(
+            self.file_name, self.content_type, self.charset, self.content_type_extra, pasta
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.file.formato = detectar_formato(raw_data[:16])
+            if self.file.formato is None:
+                self._descartar()
+                raise FormatoNaoSuportado()
+        if start + len(raw_data) > self.limite:
+            self._descartar()
+            raise ArquivoGrandeDemais(
+                f"O arquivo de '{self.field_name}' passa do limite de "
+                f"{self.limite // (1024 * 1024)} MB."
+            )
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hash.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, "file"):
+            self._descartar()
+
+    def _descartar(self):
+        # Fechar o NamedTemporaryFile apaga o arquivo parcial
+        self.file.close()
+
+
+class FotoMultiPartParser(MultiPartParser):
+    """
+    MultiPartParser que recebe os arquivos com ArquivoUploadHandler em vez
+    dos handlers padrão do Django.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context["request"]
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta["CONTENT_TYPE"] = media_type
+        handlers = [ArquivoUploadHandler(request)]
+        try:
+            parser = DjangoMultiPartParser(meta, stream, handlers, encoding)
+            data, files = parser.parse()
+            return DataAndFiles(data, files)
+        except MultiPartParserError as exc:
+            raise ParseError("Multipart form parse error - %s" % str(exc))
+
+
+def autorizar_envio(request, storage, campo, sha256, tamanho, tipo):
+    """
+    URL de upload direto para uma chave nova e o token que confirma o envio.
+    """
+    formato = TIPOS[tipo]
+    chave = f"{PASTA_ENVIOS}/{uuid.uuid4().hex}{EXTENSOES[formato]}"
+    token = signing.dumps(
+        {
+            "chave": chave,
+            "nome": f"{PASTA}/{sha256[:2]}/{sha256}{EXTENSOES[formato]}",
+            "campo": campo,
+            "tamanho": tamanho,
+            "formato": formato,
+            "usuario": request.user.pk,
+        },
+        salt=SALT_ENVIO,
+    )
+    return {
+        "token": token,
+        "upload": storage.url_de_upload(request, chave, sha256, tamanho, tipo),
+        "expira_em": datetime.datetime.now(datetime.timezone.utc)
+        + datetime.timedelta(seconds=validade_upload()),
+    }
+
+
+def ler_envio(token, usuario):
+    """
+    Dados do envio autorizado por `token` para `usuario`, ou None. O token
+    vale o dobro da URL, para um envio que começou no fim do prazo terminar.
+    """
+    try:
+        envio = signing.loads(token, salt=SALT_ENVIO, max_age=2 * validade_upload())
+    except signing.BadSignature:
+        return None
+    return envio if envio["usuario"] == usuario.pk else None
+
+
+def receber_direto(stream, sha256, tamanho, formato, chunk_size=ArquivoUploadHandler.chunk_size):
+    """
+    Lê o corpo de um envio direto (o destino local da URL de upload) para
+    MEDIA_ROOT/.uploads, conferindo formato, tamanho e SHA-256 declarados.
+    """
+    pasta = os.path.join(settings.MEDIA_ROOT, ".uploads")
+    os.makedirs(pasta, exist_ok=True)
+    arquivo = ArquivoRecebido(
+        "envio" + EXTENSOES[formato], None, None, None, pasta
+    )
+    hash = hashlib.sha256()
+    recebido = 0
+    try:
+        while stream is not None:
+            bloco = stream.read(chunk_size)
+            if not bloco:
+                break
+            if recebido == 0 and detectar_formato(bloco[:16]) != formato:
+                raise FormatoNaoSuportado()
+            recebido += len(bloco)
+            if recebido > tamanho:
+                raise ArquivoGrandeDemais("O arquivo passa do tamanho informado.")
+            hash.update(bloco)
+            arquivo.write(bloco)
+        if recebido != tamanho or hash.hexdigest() != sha256:
+            raise ParseError("O arquivo não confere com o tamanho e o SHA-256 informados.")
+    except Exception:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    arquivo.size = recebido
+    arquivo.sha256 = sha256
+    arquivo.formato = formato
+    return arquivo
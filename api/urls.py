@@ -6,9 +6,12 @@ urlpatterns = [
     # Endpoints de Autenticação
     path('register/', views.register),
     path('login/', views.login),
+    path('token/refresh/', views.token_refresh, name='token-refresh'),
+    path('token/verify/', views.token_verify, name='token-verify'),
     path('password-reset/', views.password_reset_request,name="password_reset_request"),
     path('password-reset/confirm/', views.password_reset_confirm, name='password_reset_confirm'),
     path('password-reset/verify-code/', views.password_reset_verify_code, name='password_reset_verify_code'),
+    path('alunos/import/', views.alunos_import, name='alunos-import'),
 
     # Endpoints de Perfil
     path('perfil/', views.me, name='perfil-completo'),
@@ -18,13 +21,17 @@ urlpatterns = [
     # Endpoints de Conteúdos
     path('conteudos/', views.conteudo_list, name='conteudo-list'),
     path('conteudos/create/', views.conteudo_create, name='conteudo-create'),
+    path('conteudos/import/', views.conteudo_import, name='conteudo-import'),
+    path('conteudos/para-mim/', views.conteudo_para_mim, name='conteudo-para-mim'),
     path('conteudos/<int:pk>/', views.conteudo_detail, name='conteudo-detail'),
+    path('conteudos/<int:pk>/estatisticas/', views.conteudo_estatisticas, name='conteudo-estatisticas'),
     path('conteudos/<int:pk>/update/', views.conteudo_update, name='conteudo-update'),
     path('conteudos/<int:pk>/delete/', views.conteudo_delete, name='conteudo-delete'),
 
     # Endpoints de Provas
     path('provas/', views.prova_list, name='prova-list'),
     path('provas/create/', views.prova_create, name='prova-create'),
+    path('provas/calendario/', views.prova_calendario, name='prova-calendario'),
     path('provas/<int:pk>/', views.prova_detail, name='prova-detail'),
     path('provas/<int:pk>/update/', views.prova_update, name='prova-update'),
     path('provas/<int:pk>/delete/', views.prova_delete, name='prova-delete'),
@@ -32,7 +39,13 @@ urlpatterns = [
     # Endpoints de Avaliações
     path('avaliacoes/', views.avaliacao_list, name='avaliacao-list'),
     path('avaliacoes/create/', views.avaliacao_create, name='avaliacao-create'),
+    path('avaliacoes/batch/', views.avaliacao_batch_create, name='avaliacao-batch-create'),
     path('avaliacoes/<int:pk>/', views.avaliacao_detail, name='avaliacao-detail'),
     path('avaliacoes/<int:pk>/update/', views.avaliacao_update, name='avaliacao-update'),
     path('avaliacoes/<int:pk>/delete/', views.avaliacao_delete, name='avaliacao-delete'),
+
+    # Envio direto de fotos ao storage
+    path('uploads/', views.upload_create, name='upload-create'),
+    path('uploads/direto/<str:token>/', views.upload_direto, name='upload-direto'),
+    path('uploads/confirmar/', views.upload_confirmar, name='upload-confirmar'),
 ]
\ No newline at end of file
@@ -1,16 +1,50 @@
-import random
-import string
+import math
+
+from asgiref.sync import sync_to_async
 from drf_yasg.utils import swagger_auto_schema
 from .serializers import *
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from .models import PasswordResetToken
-from django.core.mail import send_mail
+from .models import PasswordResetToken, usuarios_por_email
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.views.decorators.http import condition
 from drf_yasg import openapi
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.exceptions import APIException, Throttled, ValidationError
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenVerifySerializer
+from . import conditional, entrega, uploads
+from .armazenamento import ler_token_upload
+from .cache import get_catalog, get_conteudo_data
+from .importacao import FORMATOS, abrir_texto, detectar_formato, importar_conteudos, ler_linhas
+from .matricula import matricular_alunos
+from .outbox import enfileirar_email
+from .ranking import FEED_LIMITE, FEED_LIMITE_MAXIMO, feed_for
+from .signals import refresh_avaliacoes_ranking
+from .throttling import (
+    CadastroThrottle,
+    LoginThrottle,
+    PasswordResetThrottle,
+    limitar_concorrencia,
+    ocupar_vaga,
+)
+from .uploads import FotoMultiPartParser
+from .search import search_ids
+from .pagination import (
+    PAGINATION_PARAMETERS,
+    AvaliacaoPagination,
+    ConteudoPagination,
+    ProvaPagination,
+    paginated_response,
+)
 
 # Create your views here.
 
@@ -23,6 +57,8 @@ from rest_framework.parsers import MultiPartParser
 )
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([CadastroThrottle])
+@limitar_concorrencia("cadastro")
 def register(request):
     serializer = UserCreateSerializer(data=request.data)
     if serializer.is_valid():
@@ -31,18 +67,75 @@ def register(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+async def login(request):
+    """
+    Login assíncrono: a conferência da senha aguarda o executor de hash sem
+    prender a thread do worker (ver api.hashing). Fora do @api_view, que é
+    síncrono, mas com os mesmos parsers, throttle e teto de concorrência.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    drf_request = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+    try:
+        throttle = LoginThrottle()
+        # Lê o corpo (email) e o cache dos buckets
+        if not await sync_to_async(throttle.allow_request)(drf_request, None):
+            raise Throttled(throttle.wait())
+        with ocupar_vaga("login"):
+            serializer = LoginSerializer(data=drf_request.data)
+            if not serializer.is_valid():
+                return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                tokens = await autenticar_login(**serializer.validated_data)
+            except ValidationError as exc:
+                return JsonResponse(
+                    {"non_field_errors": exc.detail}, status=status.HTTP_400_BAD_REQUEST
+                )
+    except APIException as exc:
+        resposta = JsonResponse({"detail": exc.detail}, status=exc.status_code)
+        if getattr(exc, "wait", None):
+            resposta["Retry-After"] = str(math.ceil(exc.wait))
+        return resposta
+    return JsonResponse(tokens, status=status.HTTP_200_OK)
+
+
+# Sem sessão nem cookies: CSRF não se aplica (como no @api_view)
+login.csrf_exempt = True
+
+
 @swagger_auto_schema(
     methods=["POST"],
-    request_body=LoginSerializer,
+    operation_description="Renova o access token a partir do refresh token, sem senha. "
+    "O refresh enviado é invalidado e um novo é devolvido junto com o access.",
+    request_body=TokenRefreshSerializer,
     tags=["Auth"],
 )
 @api_view(["POST"])
 @permission_classes([AllowAny])
-def login(request):
-    serializer = LoginSerializer(data=request.data)
-    if serializer.is_valid():
-        return Response(serializer.validate(request.data), status=status.HTTP_200_OK)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+def token_refresh(request):
+    serializer = TokenRefreshSerializer(data=request.data)
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError as e:
+        raise InvalidToken(e.args[0])
+    return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    methods=["POST"],
+    operation_description="Verifica se um token (access ou refresh) é válido",
+    request_body=TokenVerifySerializer,
+    tags=["Auth"],
+)
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def token_verify(request):
+    serializer = TokenVerifySerializer(data=request.data)
+    try:
+        serializer.is_valid(raise_exception=True)
+    except TokenError as e:
+        raise InvalidToken(e.args[0])
+    return Response({}, status=status.HTTP_200_OK)
 
 
 @swagger_auto_schema(
@@ -52,20 +145,22 @@ def login(request):
 )
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([PasswordResetThrottle])
+@limitar_concorrencia("password_reset")
 def password_reset_request(request):
     serializer = PasswordResetRequestSerializer(data=request.data)
     if serializer.is_valid():
         email = serializer.validated_data["email"]
         try:
-            user = User.objects.get(email=email)
-            # Gerar código de 6 dígitos
-            code = "".join(random.choices(string.digits, k=6))
-            # Criar token com código
-            PasswordResetToken.objects.create(user=user, code=code)
-
-            # Enviar email com código
-            subject = "Recuperação de Senha - Layza"
-            message = f"""
+            user = usuarios_por_email(email).get()
+
+            with transaction.atomic():
+                # Gera o código, substituindo o anterior
+                code = PasswordResetToken.emitir(user)
+
+                # O email é enviado pelo worker (process_email_outbox), não aqui
+                subject = "Recuperação de Senha - Layza"
+                message = f"""
             Olá {user.first_name or user.username},
 
             Você solicitou a recuperação de senha. Use o código abaixo para redefinir sua senha:
@@ -75,13 +170,7 @@ def password_reset_request(request):
 
             Equipe Layza
             """
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [email],
-                fail_silently=False,
-            )
+                enfileirar_email(subject, message, [email])
 
             return Response(
                 {"message": "Código de recuperação enviado com sucesso."},
@@ -101,6 +190,8 @@ def password_reset_request(request):
 )
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([PasswordResetThrottle])
+@limitar_concorrencia("password_reset")
 def password_reset_confirm(request):
     serializer = PasswordResetConfirmSerializer(data=request.data)
     if serializer.is_valid():
@@ -108,10 +199,8 @@ def password_reset_confirm(request):
         code = serializer.validated_data["code"]
 
         try:
-            user = User.objects.get(email=email)
-            reset_token = PasswordResetToken.objects.filter(
-                user=user, code=code
-            ).first()
+            user = usuarios_por_email(email).get()
+            reset_token = PasswordResetToken.buscar(user, code)
 
             if not reset_token:
                 return Response(
@@ -148,21 +237,29 @@ def password_reset_confirm(request):
 )
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([PasswordResetThrottle])
+@limitar_concorrencia("password_reset")
 def password_reset_verify_code(request):
     serializer = CodeVerificationSerializer(data=request.data)
     if serializer.is_valid():
         code = serializer.validated_data["code"]
         email = serializer.validated_data["email"]
-        user = User.objects.filter(email=email).first()
+        user = usuarios_por_email(email).first()
         if not user:
             return Response(
                 {"email": "Email não encontrado."}, status=status.HTTP_404_NOT_FOUND
             )
-        if not PasswordResetToken.objects.filter(user=user, code=code).exists():
+        reset_token = PasswordResetToken.buscar(user, code)
+        if not reset_token:
             return Response(
                 {"code": "Código de verificação inválido."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if not reset_token.is_valid():
+            return Response(
+                {"code": "Este código expirou. Solicite um novo."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         return Response(
             {"message": "Código verificado com sucesso."}, status=status.HTTP_200_OK
         )
@@ -179,6 +276,7 @@ def password_reset_verify_code(request):
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=conditional.me_etag)
 def me(request):
     return Response(UserSerializer(request.user).data, status=status.HTTP_200_OK)
 
@@ -209,7 +307,7 @@ def me(request):
 )
 @api_view(["PUT", "PATCH"])
 @permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser])
+@parser_classes([FotoMultiPartParser])
 def perfil_update_completo(request):
     try:
         user = request.user
@@ -258,19 +356,113 @@ def perfil_delete(request):
 # endregion
 
 
+# region Matrícula
+@swagger_auto_schema(
+    methods=["POST"],
+    operation_description="Matricula uma turma inteira de uma vez (apenas administradores). "
+    "Envie um arquivo CSV ou JSONL em `arquivo` (colunas: username, email, password e, "
+    "opcionalmente, serie_atual) ou um JSON no formato {\"alunos\": [...]}. "
+    "Linhas inválidas ou já cadastradas voltam no relatório de erros.",
+    manual_parameters=[
+        openapi.Parameter("arquivo", openapi.IN_FORM, type=openapi.TYPE_FILE),
+        openapi.Parameter(
+            "formato", openapi.IN_FORM, type=openapi.TYPE_STRING, enum=list(FORMATOS),
+            required=False,
+        ),
+    ],
+    consumes=["multipart/form-data", "application/json"],
+    tags=["Auth"],
+)
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser, JSONParser])
+def alunos_import(request):
+    arquivo = request.FILES.get("arquivo")
+    if arquivo is not None:
+        formato = request.data.get("formato") or detectar_formato(arquivo.name)
+        if formato not in FORMATOS:
+            return Response(
+                {"formato": f"Formato inválido. Use: {', '.join(FORMATOS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        linhas = ler_linhas(abrir_texto(arquivo.file), formato)
+    else:
+        alunos = request.data.get("alunos")
+        if not isinstance(alunos, list) or not alunos:
+            return Response(
+                {"alunos": "Envie um arquivo CSV/JSONL ou uma lista de alunos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        linhas = enumerate(alunos, start=1)
+    relatorio = matricular_alunos(linhas)
+    return Response(relatorio, status=status.HTTP_200_OK)
+
+
+# endregion
+
+
 # region Conteúdos
 @swagger_auto_schema(
     methods=["GET"],
     operation_description="Lista todos os conteúdos disponíveis",
     tags=["Conteúdos"],
     responses={200: ConteudoSerializer(many=True)},
+    manual_parameters=[
+        openapi.Parameter(
+            "q",
+            openapi.IN_QUERY,
+            type=openapi.TYPE_STRING,
+            description="Busca por título e tema, ignorando acentos (e.g., matematica). "
+            "Retorna os resultados mais relevantes primeiro, sem paginação",
+        ),
+        *PAGINATION_PARAMETERS,
+    ],
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=conditional.conteudo_list_etag)
 def conteudo_list(request):
+    q = request.query_params.get("q")
+    if q:
+        ids = search_ids(q)
+        conteudos = Conteudo.objects.filter(is_active=True).in_bulk(ids)
+        resultados = [conteudos[pk] for pk in ids if pk in conteudos]
+        return Response(ConteudoSerializer(resultados, many=True).data)
+    if not ConteudoPagination().is_requested(request):
+        return Response(get_catalog())
     conteudos = Conteudo.objects.filter(is_active=True)
-    serializer = ConteudoSerializer(conteudos, many=True)
-    return Response(serializer.data)
+    return paginated_response(
+        request, conteudos, ConteudoPagination, ConteudoSerializer
+    )
+
+
+@swagger_auto_schema(
+    methods=["GET"],
+    operation_description="Lista conteúdos recomendados para o usuário, "
+    "conforme suas preferências de aprendizagem, série e avaliações anteriores",
+    tags=["Conteúdos"],
+    responses={200: ConteudoSerializer(many=True)},
+    manual_parameters=[
+        openapi.Parameter(
+            "limite",
+            openapi.IN_QUERY,
+            type=openapi.TYPE_INTEGER,
+            description=f"Quantidade de conteúdos (padrão {FEED_LIMITE}, máximo {FEED_LIMITE_MAXIMO})",
+        ),
+    ],
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def conteudo_para_mim(request):
+    try:
+        limite = int(request.query_params.get("limite", FEED_LIMITE))
+    except ValueError:
+        return Response(
+            {"limite": "Informe um número inteiro."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    limite = min(max(limite, 1), FEED_LIMITE_MAXIMO)
+    conteudos = feed_for(request.user, limite)
+    return Response(ConteudoSerializer(conteudos, many=True).data)
 
 
 @swagger_auto_schema(
@@ -290,6 +482,43 @@ def conteudo_create(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@swagger_auto_schema(
+    methods=["POST"],
+    operation_description="Importa conteúdos em lote de um arquivo CSV ou JSONL "
+    "(colunas: titulo, tipo, tema, url, duracao_estimada e, opcionalmente, id e is_active). "
+    "Linhas com id atualizam o conteúdo existente.",
+    manual_parameters=[
+        openapi.Parameter(
+            "arquivo", openapi.IN_FORM, type=openapi.TYPE_FILE, required=True
+        ),
+        openapi.Parameter(
+            "formato", openapi.IN_FORM, type=openapi.TYPE_STRING, enum=list(FORMATOS),
+            required=False,
+        ),
+    ],
+    consumes=["multipart/form-data"],
+    tags=["Conteúdos"],
+)
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def conteudo_import(request):
+    arquivo = request.FILES.get("arquivo")
+    if arquivo is None:
+        return Response(
+            {"arquivo": "Envie um arquivo CSV ou JSONL."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    formato = request.data.get("formato") or detectar_formato(arquivo.name)
+    if formato not in FORMATOS:
+        return Response(
+            {"formato": f"Formato inválido. Use: {', '.join(FORMATOS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    relatorio = importar_conteudos(abrir_texto(arquivo.file), formato)
+    return Response(relatorio, status=status.HTTP_200_OK)
+
+
 @swagger_auto_schema(
     methods=["GET"],
     operation_description="Retorna os detalhes de um conteúdo específico",
@@ -298,14 +527,32 @@ def conteudo_create(request):
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@condition(
+    etag_func=conditional.conteudo_detail_etag,
+    last_modified_func=conditional.conteudo_detail_last_modified,
+)
 def conteudo_detail(request, pk):
-    try:
-        conteudo = Conteudo.objects.get(pk=pk, is_active=True)
-    except Conteudo.DoesNotExist:
+    data = get_conteudo_data(pk)
+    if data is None:
         return Response(status=status.HTTP_404_NOT_FOUND)
+    return Response(data)
 
-    serializer = ConteudoSerializer(conteudo)
-    return Response(serializer.data)
+
+@swagger_auto_schema(
+    methods=["GET"],
+    operation_description="Retorna a nota média, o total e o histograma de notas de um conteúdo",
+    tags=["Conteúdos"],
+    responses={200: ConteudoEstatisticasSerializer},
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def conteudo_estatisticas(request, pk):
+    if not Conteudo.objects.filter(pk=pk, is_active=True).exists():
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    estatisticas = ConteudoEstatisticas.objects.filter(conteudo_id=pk).first()
+    if estatisticas is None:
+        estatisticas = ConteudoEstatisticas(conteudo_id=pk)
+    return Response(ConteudoEstatisticasSerializer(estatisticas).data)
 
 
 @swagger_auto_schema(
@@ -353,18 +600,80 @@ def conteudo_delete(request, pk):
 
 
 # region Provas
+PROVA_FILTRO_PARAMETERS = [
+    openapi.Parameter(
+        "from", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+        description="Só provas nesta data ou depois",
+    ),
+    openapi.Parameter(
+        "to", openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE,
+        description="Só provas nesta data ou antes",
+    ),
+    openapi.Parameter(
+        "upcoming", openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+        description="true: provas de hoje em diante; false: só as passadas",
+    ),
+]
+
+
 @swagger_auto_schema(
     methods=["GET"],
-    operation_description="Lista todas as provas do usuário autenticado",
+    operation_description="Lista as provas do usuário autenticado, por data",
     tags=["Provas"],
     responses={200: ProvaSerializer(many=True)},
+    manual_parameters=PROVA_FILTRO_PARAMETERS + PAGINATION_PARAMETERS,
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=conditional.prova_list_etag)
 def prova_list(request):
-    provas = Prova.objects.filter(usuario=request.user)
-    serializer = ProvaSerializer(provas, many=True, context={"request": request})
-    return Response(serializer.data)
+    filtro = ProvaFiltroSerializer(data=request.query_params)
+    if not filtro.is_valid():
+        return Response(filtro.errors, status=status.HTTP_400_BAD_REQUEST)
+    provas = filtro.filtrar(Prova.objects.filter(usuario=request.user))
+    return paginated_response(
+        request, provas, ProvaPagination, ProvaSerializer,
+        context={"request": request},
+    )
+
+
+@swagger_auto_schema(
+    methods=["GET"],
+    operation_description="Quantidade de provas do usuário por dia ou por mês (`por`), "
+    "com os mesmos filtros da listagem. Os meses vêm como o primeiro dia do mês.",
+    tags=["Provas"],
+    manual_parameters=PROVA_FILTRO_PARAMETERS + [
+        openapi.Parameter(
+            "por", openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=["dia", "mes"],
+            description="Agrupamento (padrão: dia)",
+        ),
+    ],
+    responses={200: "Períodos com o total de provas"},
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@condition(etag_func=conditional.prova_list_etag)
+def prova_calendario(request):
+    filtro = CalendarioFiltroSerializer(data=request.query_params)
+    if not filtro.is_valid():
+        return Response(filtro.errors, status=status.HTTP_400_BAD_REQUEST)
+    por = filtro.validated_data["por"]
+    provas = filtro.filtrar(Prova.objects.filter(usuario=request.user))
+    # Agregado no banco, direto do índice (usuario, data): uma linha por período
+    periodo = F("data") if por == "dia" else TruncMonth("data")
+    periodos = (
+        provas.annotate(periodo=periodo)
+        .values("periodo")
+        .annotate(total=Count("id"))
+        .order_by("periodo")
+    )
+    return Response({
+        "por": por,
+        "periodos": [
+            {"periodo": linha["periodo"].isoformat(), "total": linha["total"]}
+            for linha in periodos
+        ],
+    })
 
 
 @swagger_auto_schema(
@@ -393,7 +702,7 @@ def prova_list(request):
 )
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser])
+@parser_classes([FotoMultiPartParser])
 def prova_create(request):
     serializer = ProvaSerializer(data=request.data, context={"request": request})
     if serializer.is_valid():
@@ -446,7 +755,7 @@ def prova_detail(request, pk):
 )
 @api_view(["PUT", "PATCH"])
 @permission_classes([IsAuthenticated])
-@parser_classes([MultiPartParser])
+@parser_classes([FotoMultiPartParser])
 def prova_update(request, pk):
     try:
         prova = Prova.objects.get(pk=pk, usuario=request.user)
@@ -500,18 +809,22 @@ def prova_delete(request, pk):
             type=openapi.TYPE_STRING,
             description="Filtrar por tema (e.g., Matemática)",
         ),
+        *PAGINATION_PARAMETERS,
     ],
 )
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=conditional.avaliacao_list_etag)
 def avaliacao_list(request):
-    queryset = Avaliacao.objects.filter(user=request.user).select_related("conteudo")
+    queryset = AvaliacaoSerializer.setup_eager_loading(
+        Avaliacao.objects.filter(user=request.user)
+    )
     tema = request.query_params.get("tema")
     if tema:
         queryset = queryset.filter(conteudo__tema=tema)
-    queryset = queryset.order_by("-data_avaliacao")
-    serializer = AvaliacaoSerializer(queryset, many=True)
-    return Response(serializer.data)
+    return paginated_response(
+        request, queryset, AvaliacaoPagination, AvaliacaoSerializer
+    )
 
 
 @swagger_auto_schema(
@@ -524,10 +837,11 @@ def avaliacao_list(request):
 @permission_classes([IsAuthenticated])
 def avaliacao_detail(request, pk):
     try:
+        avaliacoes = AvaliacaoSerializer.setup_eager_loading(Avaliacao.objects.all())
         if request.user.is_staff:
-            avaliacao = Avaliacao.objects.get(pk=pk)
+            avaliacao = avaliacoes.get(pk=pk)
         else:
-            avaliacao = Avaliacao.objects.get(pk=pk, user=request.user)
+            avaliacao = avaliacoes.get(pk=pk, user=request.user)
         serializer = AvaliacaoSerializer(avaliacao)
         return Response(serializer.data)
     except Avaliacao.DoesNotExist:
@@ -553,6 +867,65 @@ def avaliacao_create(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@swagger_auto_schema(
+    methods=["POST"],
+    operation_description="Cria várias avaliações de uma vez (até 100) numa única "
+    "transação. Itens inválidos não impedem os demais; a resposta traz o "
+    "resultado de cada item, na ordem enviada.",
+    request_body=AvaliacaoLoteSerializer,
+    tags=["Avaliações"],
+)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def avaliacao_batch_create(request):
+    lote = AvaliacaoLoteSerializer(data=request.data)
+    if not lote.is_valid():
+        return Response(lote.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    validador = AvaliacaoLoteItemSerializer()
+    validados, erros = {}, {}
+    for indice, dados in enumerate(lote.validated_data["avaliacoes"]):
+        try:
+            validados[indice] = validador.run_validation(dados)
+        except ValidationError as exc:
+            erros[indice] = exc.detail
+
+    # Uma consulta para todos os conteúdos do lote
+    conteudos = Conteudo.objects.in_bulk(
+        {item["conteudo_id"] for item in validados.values()}
+    )
+    novas = {}
+    for indice, item in validados.items():
+        conteudo = conteudos.get(item.pop("conteudo_id"))
+        if conteudo is None:
+            erros[indice] = {"conteudo_id": ["Conteúdo não encontrado."]}
+            continue
+        novas[indice] = Avaliacao(user=request.user, conteudo=conteudo, **item)
+
+    with transaction.atomic():
+        Avaliacao.objects.bulk_create(novas.values())
+        ConteudoEstatisticas.aplicar_lote(novas.values())
+        refresh_avaliacoes_ranking(request.user, {a.conteudo_id for a in novas.values()})
+
+    resultados = []
+    for indice in range(len(lote.validated_data["avaliacoes"])):
+        if indice in novas:
+            resultados.append(
+                {
+                    "status": status.HTTP_201_CREATED,
+                    "avaliacao": AvaliacaoSerializer(novas[indice]).data,
+                }
+            )
+        else:
+            resultados.append(
+                {"status": status.HTTP_400_BAD_REQUEST, "erros": erros[indice]}
+            )
+    return Response(
+        {"criadas": len(novas), "com_erro": len(erros), "resultados": resultados},
+        status=status.HTTP_201_CREATED if novas else status.HTTP_400_BAD_REQUEST,
+    )
+
+
 @swagger_auto_schema(
     methods=["PUT", "PATCH"],
     operation_description="Atualiza uma avaliação",
@@ -564,10 +937,11 @@ def avaliacao_create(request):
 @permission_classes([IsAuthenticated])
 def avaliacao_update(request, pk):
     try:
+        avaliacoes = AvaliacaoSerializer.setup_eager_loading(Avaliacao.objects.all())
         if request.user.is_staff:
-            avaliacao = Avaliacao.objects.get(pk=pk)
+            avaliacao = avaliacoes.get(pk=pk)
         else:
-            avaliacao = Avaliacao.objects.get(pk=pk, user=request.user)
+            avaliacao = avaliacoes.get(pk=pk, user=request.user)
         serializer = AvaliacaoSerializer(
             avaliacao, data=request.data, partial=request.method == "PATCH"
         )
@@ -604,3 +978,93 @@ def avaliacao_delete(request, pk):
 
 
 # endregion
+
+
+# region Mídia
+@swagger_auto_schema(
+    methods=["GET"],
+    operation_description="Entrega uma foto (original ou miniatura). Fotos de prova só "
+    "para o dono; de perfil, os demais usuários só veem as miniaturas (o original "
+    "mantém os metadados). Aceita Range, If-None-Match e If-Modified-Since.",
+    tags=["Mídia"],
+    responses={200: "Arquivo", 206: "Parte do arquivo", 304: "Não modificado", 404: "Não encontrado"},
+)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def media_serve(request, nome):
+    # 404 também sem permissão, para não revelar quais arquivos existem
+    if not entrega.pode_ver(request.user, nome):
+        raise Http404()
+    return entrega.resposta_arquivo(request, default_storage, nome)
+
+
+@swagger_auto_schema(
+    methods=["POST"],
+    operation_description="Autoriza o envio de uma foto direto ao storage. Retorna a URL "
+    "de upload (curta duração; envie os bytes com o método e os cabeçalhos indicados) e o "
+    "token para confirmar em /api/uploads/confirmar/.",
+    tags=["Mídia"],
+    request_body=UploadDiretoSerializer,
+    responses={200: "URL de upload e token", 413: "Arquivo grande demais", 415: "Formato inválido"},
+)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_create(request):
+    serializer = UploadDiretoSerializer(data=request.data)
+    if serializer.is_valid():
+        return Response(
+            uploads.autorizar_envio(request, default_storage, **serializer.validated_data)
+        )
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@swagger_auto_schema(
+    methods=["PUT"],
+    operation_description="Destino das URLs de upload quando as fotos ficam no disco do "
+    "servidor. O corpo é a foto; tamanho e SHA-256 precisam ser os informados.",
+    tags=["Mídia"],
+    responses={204: "Recebido", 403: "Link inválido ou expirado", 413: "Arquivo grande demais"},
+)
+@api_view(["PUT"])
+@permission_classes([AllowAny])
+def upload_direto(request, token):
+    # Autorizado pelo token da URL, como uma URL pré-assinada do S3
+    dados = ler_token_upload(token)
+    if dados is None:
+        return Response(
+            {"detail": "Link de envio inválido ou expirado."}, status=status.HTTP_403_FORBIDDEN
+        )
+    arquivo = uploads.receber_direto(
+        request.stream, dados["sha256"], dados["tamanho"], uploads.TIPOS[dados["tipo"]]
+    )
+    try:
+        # Reenvio para a mesma URL: substitui o anterior
+        default_storage.delete(dados["nome"])
+        default_storage.save(dados["nome"], arquivo)
+    finally:
+        arquivo.close()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@swagger_auto_schema(
+    methods=["POST"],
+    operation_description="Confirma um envio direto: anexa a foto à prova (campo `foto`, "
+    "informe `prova`) ou ao perfil (`foto_perfil`) e retorna o registro atualizado.",
+    tags=["Mídia"],
+    request_body=ConfirmarUploadSerializer,
+    responses={200: "Prova ou usuário atualizado", 400: "Token inválido ou envio incompleto"},
+)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_confirmar(request):
+    serializer = ConfirmarUploadSerializer(data=request.data, context={"request": request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    instancia = serializer.save()
+    if isinstance(instancia, Prova):
+        return Response(ProvaSerializer(instancia, context={"request": request}).data)
+    user = UserSerializer.setup_eager_loading(User.objects.all()).get(pk=request.user.pk)
+    return Response(UserSerializer(user, context={"request": request}).data)
+
+
+# endregion
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     "api",
     "drf_yasg",
     "rest_framework_simplejwt",
+    "rest_framework_simplejwt.token_blacklist",
     "corsheaders",
 ]
 
@@ -59,18 +61,24 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Proxies reversos na frente da API. O IP dos limites de taxa é o
+    # REMOTE_ADDR (0) ou o endereço que o último proxy acrescentou ao
+    # X-Forwarded-For; o resto do cabeçalho vem do cliente e não é confiável
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
 }
 from datetime import timedelta
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "ROTATE_REFRESH_TOKENS": False,
+    # Renovar a sessão com /api/token/refresh/ é só uma checagem de assinatura;
+    # o refresh dura mais que o access para o cliente não precisar da senha
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
+    "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
 }
 
@@ -114,6 +122,70 @@ DATABASES = {
 }
 
 
+# Cache
+# Precisa ser compartilhado entre os workers: a versão do catálogo e o usuário
+# autenticado em cache são invalidados nele. Com REDIS_URL usa o Redis (requer
+# `pip install redis`); sem ele, a memória de cada processo, que só serve para
+# desenvolvimento ou para um único processo. Com DEBUG = False a API não sobe
+# com cache local, a menos que CACHE_LOCAL_PERMITIDO = True (um worker só).
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "layza",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "layza",
+        }
+    }
+CACHE_LOCAL_PERMITIDO = False
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Hash de senha no login (ver api/hashing.py): threads dedicadas, tamanho da
+# fila de espera e quanto tempo (s) um login espera antes de responder 503.
+# Valem por processo; a fila só enche com o login servido por ASGI, onde um
+# processo atende vários logins ao mesmo tempo
+LOGIN_HASH_WORKERS = os.cpu_count() or 2
+LOGIN_HASH_QUEUE = 2 * LOGIN_HASH_WORKERS
+LOGIN_HASH_TIMEOUT = 5
+# Usuário autenticado em cache (segundos); invalidado quando usuário ou perfil mudam
+PRINCIPAL_CACHE_TIMEOUT = 60
+# Processos usados para o hash das senhas na matrícula em lote
+MATRICULA_HASH_PROCESSES = os.cpu_count() or 2
+# Processos que geram as miniaturas das fotos (ver api/imagens.py); 0 gera na
+# hora, no próprio processo, depois do commit
+IMAGEM_PROCESSES = os.cpu_count() or 2
+# Tamanho máximo (bytes) de cada campo de foto nos uploads (ver api/uploads.py)
+UPLOAD_LIMITES = {
+    "foto": 10 * 1024 * 1024,
+    "foto_perfil": 5 * 1024 * 1024,
+}
+
+# Limites dos endpoints públicos de autenticação (ver api/throttling.py): taxa
+# por IP e por email (token bucket) e requisições simultâneas por endpoint.
+# Vários alunos de uma escola podem sair pelo mesmo IP, por isso o limite por
+# IP é mais folgado que o por email.
+AUTH_THROTTLE_RATES = {
+    "login": {"ip": "60/min", "email": "10/min"},
+    "cadastro": {"ip": "100/hour", "email": "5/hour"},
+    "password_reset": {"ip": "30/min", "email": "10/hour"},
+}
+AUTH_CONCURRENCY = {
+    "login": LOGIN_HASH_WORKERS + LOGIN_HASH_QUEUE,
+    "cadastro": 16,
+    "password_reset": 16,
+}
+# Alias de um cache compartilhado (ex.: Redis) para os buckets; None mantém os
+# buckets na memória de cada processo
+AUTH_THROTTLE_CACHE = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -171,4 +243,28 @@ CORS_ALLOW_CREDENTIALS = True
 import os
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Quem envia os bytes das fotos depois da checagem de acesso (api/entrega.py):
+# None (o servidor WSGI, com sendfile), "x-accel-redirect" (nginx) ou
+# "x-sendfile" (Apache/lighttpd). Com nginx, MEDIA_ACCEL_PREFIX é a location
+# `internal` que aponta para o MEDIA_ROOT.
+MEDIA_ENTREGA = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Onde ficam as fotos (ver api/armazenamento.py). Para um S3 ou MinIO:
+# "default": {
+#     "BACKEND": "api.armazenamento.S3Storage",
+#     "OPTIONS": {
+#         "endpoint_url": "https://s3.us-east-1.amazonaws.com",
+#         "bucket": "layza-media",
+#         "region": "us-east-1",
+#         "access_key": os.getenv("S3_ACCESS_KEY"),
+#         "secret_key": os.getenv("S3_SECRET_KEY"),
+#     },
+# },
+STORAGES = {
+    "default": {"BACKEND": "api.armazenamento.LocalStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+# Validade (segundos) das URLs de envio direto de fotos
+UPLOAD_DIRETO_VALIDADE = 10 * 60
@@ -20,7 +20,7 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.conf import settings
-from django.conf.urls.static import static
+from api.views import media_serve
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -42,4 +42,6 @@ urlpatterns += [
    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+   # Fotos com controle de acesso, cache e Range (ver api/entrega.py)
+   path(settings.MEDIA_URL.lstrip('/') + '<path:nome>', media_serve, name='media'),
+]
\ No newline at end of file